@@ -0,0 +1,56 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+"""
+Import-time budget of senteval: `import senteval` must stay under the
+budget and must not import the dependencies of the tasks (torch,
+scikit-learn, scipy, MeCab), which the registry only imports with them.
+Each run imports senteval in a fresh interpreter.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PATH_TO_SENTEVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HEAVY_MODULES = ['torch', 'sklearn', 'scipy', 'MeCab']
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import senteval
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'imported': [m for m in %r if m in sys.modules]}))
+''' % (PATH_TO_SENTEVAL, HEAVY_MODULES)
+
+
+def import_senteval():
+    out = subprocess.check_output([sys.executable, '-c', PROBE])
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='max seconds of `import senteval` (best of runs)')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [import_senteval() for _ in range(args.runs)]
+    best = min(r['seconds'] for r in results)
+    imported = sorted(set(m for r in results for m in r['imported']))
+    print('import senteval: best {0:.3f} s of {1} runs (budget {2:.3f} s)'
+          .format(best, args.runs, args.budget))
+
+    assert not imported, 'import senteval imported {0}'.format(imported)
+    assert best <= args.budget, \
+        'import senteval took {0:.3f} s > {1:.3f} s'.format(best, args.budget)
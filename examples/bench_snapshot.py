@@ -0,0 +1,80 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+"""
+Benchmark of the best-model snapshot of early stopping: utils.ModelSnapshot
+(save/restore in place) against the copy.deepcopy of the model it replaces,
+on an MLP of the size of the classifiers. Asserts that the snapshot is
+faster and that restoring keeps the tensors of the model and optimizer.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import copy
+import os
+import sys
+import timeit
+
+PATH_TO_SENTEVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PATH_TO_SENTEVAL)
+
+import torch
+from torch import nn
+
+from senteval import utils
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inputdim', type=int, default=4096)
+    parser.add_argument('--nhid', type=int, default=512)
+    parser.add_argument('--nclasses', type=int, default=3)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    device = utils.get_device(args.device)
+    model = nn.Sequential(
+        nn.Linear(args.inputdim, args.nhid),
+        nn.Sigmoid(),
+        nn.Linear(args.nhid, args.nclasses),
+    ).to(device)
+    optimizer = torch.optim.Adam(model.parameters())
+    params = list(model.parameters())
+
+    def sync():
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    def deepcopy_save():
+        copy.deepcopy(model)
+        sync()
+
+    snapshot = utils.ModelSnapshot(model)
+
+    def snapshot_save():
+        snapshot.save()
+        sync()
+
+    deepcopy_time = min(timeit.repeat(deepcopy_save, number=args.number, repeat=3))
+    snapshot_time = min(timeit.repeat(snapshot_save, number=args.number, repeat=3))
+    print('best model save on {0} ({1} params): deepcopy {2:.3f} ms, '
+          'ModelSnapshot {3:.3f} ms ({4:.1f}x)'.format(
+              device, sum(p.numel() for p in params),
+              1000 * deepcopy_time / args.number,
+              1000 * snapshot_time / args.number, deepcopy_time / snapshot_time))
+
+    # restore writes the saved values into the tensors the optimizer holds
+    saved = [p.detach().clone() for p in params]
+    with torch.no_grad():
+        for p in params:
+            p.add_(1)
+    snapshot.restore()
+    assert all(p is q for p, q in zip(model.parameters(), params))
+    assert all(p is q for p, q in zip(optimizer.param_groups[0]['params'], params))
+    assert all(torch.equal(p, s) for p, s in zip(params, saved))
+    assert snapshot_time < deepcopy_time, 'ModelSnapshot is slower than deepcopy'
@@ -63,27 +63,32 @@ def output_reader():
             outq.put(line)
 
 
-def batcher(params, batch):
-    for sentence_tokens in batch:
-        if sp:
-            if args.language == 'en':
-                sentence = ' '.join(sentence_tokens)
-            elif args.language == 'ja':
-                sentence = ''.join(sentence_tokens)
-            sentence_tokens = sp.encode_line(sentence)
-        if len(sentence_tokens) > args.max_tokens:
-            sentence_tokens = sentence_tokens[:args.max_tokens]
-        sentence = ' '.join(sentence_tokens)
-        proc.stdin.write(sentence + '\n')
-
-    embeddings = []
-    global count
-
-    for i in range(len(batch)):
-        line = outq.get(timeout=60)
-        embeddings.append(list(map(float, line[len(embedding_prefix):].rstrip().split(' '))))
-
-    return np.array(embeddings)
+class PipeBatcher(object):
+    """
+    Sends batches to the extractor without waiting for the embeddings of the
+    previous ones; SentEval collects them in order.
+    """
+    def submit(self, params, batch):
+        for sentence_tokens in batch:
+            if sp:
+                if args.language == 'en':
+                    sentence = ' '.join(sentence_tokens)
+                elif args.language == 'ja':
+                    sentence = ''.join(sentence_tokens)
+                sentence_tokens = sp.encode_line(sentence)
+            if len(sentence_tokens) > args.max_tokens:
+                sentence_tokens = sentence_tokens[:args.max_tokens]
+            sentence = ' '.join(sentence_tokens)
+            proc.stdin.write(sentence + '\n')
+        return len(batch)
+
+    def collect(self, nsentences):
+        embeddings = []
+        for i in range(nsentences):
+            line = outq.get(timeout=60)
+            embeddings.append(list(map(float, line[len(embedding_prefix):].rstrip().split(' '))))
+
+        return np.array(embeddings)
 
 
 # Set up logger
@@ -114,7 +119,7 @@ if __name__ == "__main__":
                                       'tenacity': 5, 'epoch_size': 4}}
 
     try:
-        se = senteval.engine.SE(params_senteval, batcher, prepare)
+        se = senteval.engine.SE(params_senteval, PipeBatcher(), prepare)
         results = se.eval(args.tasks)
         print(results)
     except Exception as e:
@@ -24,6 +24,9 @@ import numpy as np
 from scipy.stats import spearmanr
 from sklearn.linear_model import RidgeCV
 
+from senteval import timing
+from senteval.encoding import encode
+
 
 class BeanMascEval(object):
     def __init__(self, task_path, task, seed=1111):
@@ -62,7 +65,6 @@ class BeanMascEval(object):
 
     def run(self, params, batcher):
         embed = {}
-        bsize = params.batch_size
 
         logging.info('Computing embedding')
         # Sort to reduce padding
@@ -71,17 +73,13 @@ class BeanMascEval(object):
                              key=lambda z: (len(z[0]), z[1]))
         self.eval_data['X'], self.eval_data['y'] = map(list, zip(*sorted_data))
 
-        embed['X'] = []
-        for ii in range(0, len(self.eval_data['y']), bsize):
-            batch = self.eval_data['X'][ii:ii + bsize]
-            embeddings = batcher(params, batch)
-            embed['X'].append(embeddings)
-        embed['X'] = np.vstack(embed['X'])
+        embed['X'] = encode(params, batcher, self.eval_data['X'])
         embed['y'] = np.array(self.eval_data['y'])
         logging.info('Computed embeddings')
 
         # like in Pavlick and Tetreault (cv with 10 folds and just return mean cv score)
-        clf = RidgeCV(cv=10, scoring=lambda estimator, X, y: spearmanr(estimator.predict(X), y)[0]
-                      ).fit(embed['X'], embed['y'])
+        with timing.stage('search'):
+            clf = RidgeCV(cv=10, scoring=lambda estimator, X, y: spearmanr(estimator.predict(X), y)[0]
+                          ).fit(embed['X'], embed['y'])
 
         return {'spearman': clf.best_score_}
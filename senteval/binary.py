@@ -14,8 +14,9 @@ import io
 import os
 import numpy as np
 import logging
-import MeCab
 
+from senteval import japanese
+from senteval.encoding import encode
 from senteval.tools.validation import InnerKFoldClassifier
 
 
@@ -36,18 +37,13 @@ class BinaryClassifierEval(object):
             return [line.split() for line in f.read().splitlines()]
 
     def run(self, params, batcher):
-        enc_input = []
         # Sort to reduce padding
         sorted_corpus = sorted(zip(self.samples, self.labels),
                                key=lambda z: (len(z[0]), z[1]))
         sorted_samples = [x for (x, y) in sorted_corpus]
         sorted_labels = [y for (x, y) in sorted_corpus]
         logging.info('Generating sentence embeddings')
-        for ii in range(0, self.n_samples, params.batch_size):
-            batch = sorted_samples[ii:ii + params.batch_size]
-            embeddings = batcher(params, batch)
-            enc_input.append(embeddings)
-        enc_input = np.vstack(enc_input)
+        enc_input = encode(params, batcher, sorted_samples)
         logging.info('Generated sentence embeddings')
 
         config = {'nclasses': 2, 'seed': self.seed,
@@ -104,14 +100,10 @@ class AmBritEval(BinaryClassifierEval):
 class AmazonJaEval(BinaryClassifierEval):
     def __init__(self, task_path, seed=1111):
         logging.debug('***** Transfer task : AmazonJa *****\n\n')
-        self.mecab_wrapper = MeCab.Tagger("-Owakati")
         positive = self.loadFile(os.path.join(task_path, '10000positive.txt.sp'), encoding='utf8')
         negative = self.loadFile(os.path.join(task_path, '10000negative.txt.sp'), encoding='utf8')
         super(self.__class__, self).__init__(positive, negative, seed)
 
     def loadFile(self, fpath, encoding='latin-1'):
         with io.open(fpath, 'r', encoding=encoding) as f:
-            return [self.tokenize(line) for line in f.read().splitlines()]
-
-    def tokenize(self, sentence):
-        return self.mecab_wrapper.parse(sentence).split()
+            return japanese.tokenize(f.read().splitlines())
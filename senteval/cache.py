@@ -0,0 +1,173 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+Persistent, content-addressed cache of sentence embeddings
+
+Embeddings are keyed by (encoder fingerprint, hash of the token list) and
+stored as float32 .npy shards that are memory-mapped on load.
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import io
+import hashlib
+import logging
+import pickle
+from collections import deque
+from itertools import islice
+import numpy as np
+
+
+def sentence_key(sentence):
+    """
+    Content hash of a token list. Tokens may be str or bytes; the batcher
+    gets them as they are, so the type is part of the key: each token ends
+    with 0x00 if str (UTF-8 encoded) and 0x01 if bytes.
+    """
+    h = hashlib.sha1()
+    for token in sentence:
+        if isinstance(token, bytes):
+            h.update(token)
+            h.update(b'\x01')
+        else:
+            h.update(token.encode('utf-8'))
+            h.update(b'\x00')
+    return h.digest()
+
+
+def atomic_write(fpath, data):
+    """ Write bytes to fpath so that readers never see a partial file """
+    tmp = '%s.tmp%d' % (fpath, os.getpid())
+    with io.open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, fpath)
+
+
+class EmbeddingCache(object):
+    def __init__(self, cache_dir, fingerprint, shard_size=50000):
+        dirname = hashlib.sha1(str(fingerprint).encode('utf-8')).hexdigest()
+        self.path = os.path.join(cache_dir, dirname)
+        self.shard_size = shard_size
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self.index = {}  # sentence key -> (shard id, row)
+        self.shards = {}  # shard id -> memory-mapped array
+        self.pending = {}  # sentence key -> embedding not yet on disk
+        self.nshards = 0
+        self.hits, self.misses = 0, 0
+
+        index_path = os.path.join(self.path, 'index.pkl')
+        if os.path.exists(index_path):
+            with io.open(index_path, 'rb') as f:
+                self.index = pickle.load(f)
+            if self.index:
+                self.nshards = max(s for s, _ in self.index.values()) + 1
+        logging.info('Embedding cache at {0} with {1} entries'
+                     .format(self.path, len(self.index)))
+
+    def shard(self, shard_id):
+        if shard_id not in self.shards:
+            fpath = os.path.join(self.path, 'shard-%05d.npy' % shard_id)
+            self.shards[shard_id] = np.load(fpath, mmap_mode='r')
+        return self.shards[shard_id]
+
+    def get(self, key):
+        if key in self.pending:
+            return self.pending[key]
+        if key in self.index:
+            shard_id, row = self.index[key]
+            return self.shard(shard_id)[row]
+        return None
+
+    def add(self, keys, embeddings):
+        for key, embedding in zip(keys, embeddings):
+            self.pending[key] = embedding
+        if len(self.pending) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        keys = list(self.pending.keys())
+        shard = np.vstack([self.pending[k] for k in keys]).astype(np.float32)
+        buf = io.BytesIO()
+        np.save(buf, shard)
+        atomic_write(os.path.join(self.path, 'shard-%05d.npy' % self.nshards),
+                     buf.getvalue())
+        for row, key in enumerate(keys):
+            self.index[key] = (self.nshards, row)
+        atomic_write(os.path.join(self.path, 'index.pkl'),
+                     pickle.dumps(self.index, protocol=pickle.HIGHEST_PROTOCOL))
+        logging.info('Embedding cache: wrote shard {0} ({1} embeddings)'
+                     .format(self.nshards, len(keys)))
+        self.nshards += 1
+        self.pending = {}
+
+
+class CachedBatcher(object):
+    """
+    Wraps a batcher so that only sentences missing from the cache are
+    sent to the encoder. Output rows keep the order of the input batch.
+    """
+    def __init__(self, batcher, cache):
+        self.batcher = batcher
+        self.cache = cache
+
+    def __call__(self, params, batch):
+        keys, rows, missing = self.lookup(batch)
+        if missing:
+            self.fill(keys, rows, missing,
+                      self.batcher(params, self.subbatch(batch, missing)))
+        return np.vstack(rows)
+
+    def map(self, params, batches):
+        # only batches with missing sentences go to the (async) batcher,
+        # answers are matched back to their batch in order
+        pending = deque()
+
+        def subbatches():
+            for batch in batches:
+                keys, rows, missing = self.lookup(batch)
+                pending.append((keys, rows, missing))
+                if missing:
+                    yield self.subbatch(batch, missing)
+        if hasattr(self.batcher, 'map'):
+            results = self.batcher.map(params, subbatches())
+        else:
+            results = (self.batcher(params, batch) for batch in subbatches())
+
+        done = deque()
+        while True:
+            if not pending:
+                done.extend(islice(results, 1))
+                if not pending:
+                    return
+            keys, rows, missing = pending.popleft()
+            if missing:
+                if not done:
+                    done.append(next(results))
+                self.fill(keys, rows, missing, done.popleft())
+            yield np.vstack(rows)
+
+    def lookup(self, batch):
+        keys = [sentence_key(sent) for sent in batch]
+        rows = [self.cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        self.cache.hits += len(batch) - len(missing)
+        self.cache.misses += len(missing)
+        return keys, rows, missing
+
+    def subbatch(self, batch, missing):
+        return batch if len(missing) == len(batch) else [batch[i] for i in missing]
+
+    def fill(self, keys, rows, missing, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.cache.add([keys[i] for i in missing], embeddings)
+        for i, embedding in zip(missing, embeddings):
+            rows[i] = embedding
@@ -0,0 +1,52 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+Per-task result checkpoints of an evaluation run
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import io
+import logging
+import pickle
+
+from senteval.cache import atomic_write
+
+
+class RunCheckpoint(object):
+    """
+    Stores the results of each finished task in run_dir, tagged with the
+    fingerprint of the params (which includes the encoder fingerprint).
+    Results saved under another fingerprint are never reused.
+    """
+    def __init__(self, run_dir, fingerprint, resume=True):
+        self.run_dir = run_dir
+        self.fingerprint = fingerprint
+        self.resume = resume
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+
+    def path(self, name):
+        return os.path.join(self.run_dir, name + '.pkl')
+
+    def load(self, name):
+        if not self.resume or not os.path.exists(self.path(name)):
+            return None
+        with io.open(self.path(name), 'rb') as f:
+            saved = pickle.load(f)
+        if saved['fingerprint'] != self.fingerprint:
+            logging.info('Checkpoint of {0} was made with other params, '
+                         'rerunning it'.format(name))
+            return None
+        return saved['results']
+
+    def save(self, name, results):
+        atomic_write(self.path(name),
+                     pickle.dumps({'task': name, 'fingerprint': self.fingerprint,
+                                   'results': results},
+                                  protocol=pickle.HIGHEST_PROTOCOL))
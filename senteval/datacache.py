@@ -0,0 +1,223 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+Binary cache of the preprocessed data of the tasks
+
+A task is constructed from its raw files once; its attributes are then
+stored as an interned vocabulary, token-id and offset arrays for the
+sentences, numpy arrays for labels and features, and a pickled skeleton
+for everything else. Later runs memory-map these arrays and rebuild the
+task without parsing or tokenizing anything. Entries are invalidated by a
+content hash of the files of the task.
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import io
+import hashlib
+import logging
+import pickle
+import numpy as np
+
+from senteval import japanese
+from senteval.cache import atomic_write
+
+VERSION = 1
+
+
+def source_files(path):
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names)
+    return sorted(files)
+
+
+def source_stats(files):
+    stats = {}
+    for fpath in files:
+        st = os.stat(fpath)
+        stats[fpath] = (st.st_size, st.st_mtime_ns)
+    return stats
+
+
+def content_hash(files):
+    h = hashlib.sha1()
+    for fpath in files:
+        h.update(fpath.encode('utf-8') + b'\x00')
+        with io.open(fpath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def is_sentence(x):
+    return isinstance(x, list) and all(isinstance(t, (str, bytes)) for t in x)
+
+
+class Packer(object):
+    """
+    Splits an object into a picklable skeleton and numpy arrays. Lists of
+    token lists become arrays of sentence ids; each distinct sentence
+    object is stored once, as token ids into the vocabulary.
+    """
+    def __init__(self):
+        self.vocab, self.token_ids = [], {}
+        self.ids, self.offsets = [], [0]
+        self.sentence_ids = {}  # id(sentence) -> sentence id
+        self.arrays = []
+
+    def array(self, a):
+        self.arrays.append(np.ascontiguousarray(a))
+        return len(self.arrays) - 1
+
+    def sentence(self, sent):
+        if id(sent) not in self.sentence_ids:
+            for token in sent:
+                if token not in self.token_ids:
+                    self.token_ids[token] = len(self.vocab)
+                    self.vocab.append(token)
+                self.ids.append(self.token_ids[token])
+            self.offsets.append(len(self.ids))
+            self.sentence_ids[id(sent)] = len(self.offsets) - 2
+        return self.sentence_ids[id(sent)]
+
+    def pack(self, obj):
+        if type(obj) is dict:
+            return ('dict', type(obj), [(k, self.pack(v)) for k, v in obj.items()])
+        if type(obj) in (list, tuple) and obj and all(is_sentence(x) for x in obj):
+            ids = np.array([self.sentence(x) for x in obj], dtype=np.int64)
+            return ('sentences', type(obj), self.array(ids))
+        if isinstance(obj, list) and obj and len(set(type(x) for x in obj)) == 1 \
+                and type(obj[0]) in (int, float, bool):
+            return ('numbers', list, self.array(np.array(obj)))
+        if type(obj) in (list, tuple):
+            return ('sequence', type(obj), [self.pack(x) for x in obj])
+        if isinstance(obj, np.ndarray) and obj.dtype != object:
+            return ('array', np.ndarray, self.array(obj))
+        return ('value', None, obj)
+
+
+class Unpacker(object):
+    def __init__(self, vocab, ids, offsets, arrays):
+        self.vocab = np.empty(len(vocab), dtype=object)
+        self.vocab[:] = vocab
+        self.ids, self.offsets, self.arrays = ids, offsets, arrays
+        self.sentences = None
+
+    def sentence_list(self):
+        # all sentences are decoded at once, and shared by the attributes
+        if self.sentences is None:
+            tokens = self.vocab[self.ids].tolist()
+            offsets = self.offsets.tolist()
+            self.sentences = [tokens[offsets[i]:offsets[i + 1]]
+                              for i in range(len(offsets) - 1)]
+        return self.sentences
+
+    def unpack(self, packed):
+        kind, cls, value = packed
+        if kind == 'dict':
+            return cls((k, self.unpack(v)) for k, v in value)
+        if kind == 'sentences':
+            sentences = self.sentence_list()
+            return cls(sentences[i] for i in self.arrays[value].tolist())
+        if kind == 'numbers':
+            return self.arrays[value].tolist()
+        if kind == 'sequence':
+            return cls(self.unpack(x) for x in value)
+        if kind == 'array':
+            return self.arrays[value]
+        return value
+
+
+class TaskDataCache(object):
+    """
+    Cache of the task objects built from the files under their data path
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def entry(self, spec, path, kwargs):
+        key = (VERSION, spec.module, spec.cls, os.path.abspath(path),
+               sorted(kwargs.items()))
+        if spec.mecab:
+            # MeCab tokens depend on the dictionary, like the tokenizer cache
+            key += (japanese.dictionary_version(),)
+        key = repr(key)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def load(self, spec, cls, path, kwargs):
+        dirname = self.entry(spec, path, kwargs)
+        files = source_files(path)
+        stats = source_stats(files)
+        meta_path = os.path.join(dirname, 'meta.pkl')
+
+        meta = None
+        if os.path.exists(meta_path):
+            with io.open(meta_path, 'rb') as f:
+                meta = pickle.load(f)
+            if meta['stats'] != stats:
+                # files touched: only rebuild if their content changed
+                if meta['hash'] == content_hash(files):
+                    meta['stats'] = stats
+                    atomic_write(meta_path, pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL))
+                else:
+                    logging.info('Data of {0} changed, rebuilding its cache'.format(spec.cls))
+                    meta = None
+        if meta is not None:
+            return self.restore(cls, dirname, meta)
+
+        evaluation = cls(path, **kwargs)
+        self.save(evaluation, dirname, stats, content_hash(files))
+        return evaluation
+
+    def save(self, evaluation, dirname, stats, digest):
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        packer = Packer()
+        attributes = []
+        for name, value in evaluation.__dict__.items():
+            try:
+                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                # e.g. tokenizers, only used while loading
+                logging.info('Attribute {0} is not cached'.format(name))
+                continue
+            attributes.append((name, packer.pack(value)))
+
+        # arrays are named after the content hash, so that readers of a
+        # previous version of the entry keep consistent files
+        arrays = [np.array(packer.ids, dtype=np.int32),
+                  np.array(packer.offsets, dtype=np.int64)] + packer.arrays
+        names = ['array-%s-%05d.npy' % (digest[:16], i) for i in range(len(arrays))]
+        for fname, a in zip(names, arrays):
+            buf = io.BytesIO()
+            np.save(buf, a)
+            atomic_write(os.path.join(dirname, fname), buf.getvalue())
+        # the skeleton is written last: an entry is complete once it exists
+        meta = {'stats': stats, 'hash': digest, 'vocab': packer.vocab,
+                'arrays': names, 'attributes': attributes}
+        atomic_write(os.path.join(dirname, 'meta.pkl'),
+                     pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL))
+        for fname in os.listdir(dirname):
+            if fname.startswith('array-') and fname not in names:
+                os.remove(os.path.join(dirname, fname))
+        logging.info('Cached the data of {0}: {1} sentences, {2} tokens, vocabulary of {3}'
+                     .format(type(evaluation).__name__, len(packer.offsets) - 1,
+                             len(packer.ids), len(packer.vocab)))
+
+    def restore(self, cls, dirname, meta):
+        arrays = [np.load(os.path.join(dirname, fname), mmap_mode='r')
+                  for fname in meta['arrays']]
+        unpacker = Unpacker(meta['vocab'], arrays[0], arrays[1], arrays[2:])
+        evaluation = cls.__new__(cls)
+        for name, packed in meta['attributes']:
+            setattr(evaluation, name, unpacker.unpack(packed))
+        logging.info('Loaded {0} from the data cache'.format(cls.__name__))
+        return evaluation
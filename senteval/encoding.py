@@ -0,0 +1,191 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+Sentence encoding helpers shared by the engine and the tasks
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import asyncio
+import inspect
+import logging
+import tempfile
+import threading
+from collections import deque
+import numpy as np
+
+from senteval.cache import sentence_key
+
+
+def batch_slices(params, *sentences):
+    """
+    Yields (start, stop) slices of the sentence list(s), of params.batch_size
+    sentences each. If params.max_tokens is set, contiguous sentences are
+    packed instead while (number of sentences x longest sentence) stays
+    within that budget; a sentence longer than the budget is a batch of its
+    own. Paired lists (e.g. STS) are sliced together.
+    """
+    n = len(sentences[0])
+    if not params.max_tokens:
+        for ii in range(0, n, params.batch_size):
+            yield ii, min(ii + params.batch_size, n)
+        return
+
+    start, longest = 0, 0
+    for ii in range(n):
+        length = max(max(len(x[ii]) for x in sentences), 1)
+        if ii > start and max(longest, length) * (ii + 1 - start) > params.max_tokens:
+            yield start, ii
+            start, longest = ii, 0
+        longest = max(longest, length)
+    if start < n:
+        yield start, n
+
+
+def allocate(params, shape):
+    """
+    float32 array for shape, backed by an anonymous temporary file in
+    params.memmap_dir if it is larger than params.ram_budget bytes
+    """
+    nbytes = 4 * int(np.prod(shape))
+    if params.ram_budget is not None and nbytes > params.ram_budget:
+        logging.info('Memory-mapping {0} MB of embeddings'.format(nbytes >> 20))
+        return np.memmap(tempfile.TemporaryFile(dir=params.memmap_dir),
+                         dtype=np.float32, mode='w+', shape=shape)
+    return np.empty(shape, dtype=np.float32)
+
+
+def is_async_batcher(batcher):
+    return inspect.iscoroutinefunction(batcher) or \
+        inspect.iscoroutinefunction(getattr(batcher, '__call__', None)) or \
+        (hasattr(batcher, 'submit') and hasattr(batcher, 'collect'))
+
+
+class AsyncBatcher(object):
+    """
+    Adapts an `async def batcher(params, batch)`, or an object with
+    submit(params, batch) -> handle and collect(handle) -> embeddings, to a
+    batcher. map() keeps up to max_inflight batches in flight and yields
+    their embeddings in order.
+    """
+    def __init__(self, batcher, max_inflight=4):
+        self.batcher = batcher
+        self.max_inflight = max(1, max_inflight)
+        self.loop = None
+        if hasattr(batcher, 'submit') and hasattr(batcher, 'collect'):
+            self.submit, self.collect = batcher.submit, batcher.collect
+        else:
+            self.submit, self.collect = self.submit_coroutine, lambda f: f.result()
+
+    def submit_coroutine(self, params, batch):
+        # coroutines run in an event loop of their own, in a daemon thread
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.batcher(params, batch),
+                                                self.loop)
+
+    def __call__(self, params, batch):
+        return self.collect(self.submit(params, batch))
+
+    def map(self, params, batches):
+        inflight = deque()
+        for batch in batches:
+            inflight.append(self.submit(params, batch))
+            if len(inflight) >= self.max_inflight:
+                yield self.collect(inflight.popleft())
+        while inflight:
+            yield self.collect(inflight.popleft())
+
+
+def map_batches(params, batcher, batches):
+    """ Embeddings of each of the batches, in order """
+    if hasattr(batcher, 'map'):
+        return batcher.map(params, batches)
+    return (batcher(params, batch) for batch in batches)
+
+
+def map_pairs(params, batcher, samples1, samples2):
+    """ Yields (start, stop, embeddings1, embeddings2) of aligned batches """
+    slices = list(batch_slices(params, samples1, samples2))
+    batches = (batch for ii, jj in slices
+               for batch in (samples1[ii:jj], samples2[ii:jj]))
+    results = map_batches(params, batcher, batches)
+    for (ii, jj), enc1, enc2 in zip(slices, results, results):
+        yield ii, jj, enc1, enc2
+
+
+def encode(params, batcher, samples, order=None):
+    """
+    Embeddings of samples, in order, written batch by batch into an array
+    sized from the first batch (no list of batches to stack). With order
+    (e.g. to sort by length), samples are sent to the batcher in that order
+    and each batch is written straight into the rows of its samples.
+    """
+    if order is not None:
+        order = np.asarray(order)
+        samples = [samples[i] for i in order]
+    slices = list(batch_slices(params, samples))
+    batches = (samples[ii:jj] for ii, jj in slices)
+    embeddings = None
+    for (ii, jj), batch_embeddings in zip(slices, map_batches(params, batcher, batches)):
+        batch_embeddings = np.asarray(batch_embeddings)
+        if embeddings is None:
+            embeddings = allocate(params, (len(samples), batch_embeddings.shape[1]))
+        if order is None:
+            embeddings[ii:jj] = batch_embeddings
+        else:
+            embeddings[order[ii:jj]] = batch_embeddings
+    if embeddings is None:
+        embeddings = np.empty((0, 0), dtype=np.float32)
+    return embeddings
+
+
+class EmbeddingTable(object):
+    """
+    Embeddings of a set of unique sentences. The table itself can be used
+    as a batcher: a batch is answered with the rows of its sentences.
+    """
+    def __init__(self, samples):
+        self.index = {}  # sentence key -> row
+        self.sentences = []
+        for sent in samples:
+            key = sentence_key(sent)
+            if key not in self.index:
+                self.index[key] = len(self.sentences)
+                self.sentences.append(sent)
+        self.embeddings = None
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def encode(self, params, batcher):
+        # Sort to reduce padding
+        order = sorted(range(len(self.sentences)),
+                       key=lambda i: len(self.sentences[i]))
+        slices = list(batch_slices(params, [self.sentences[i] for i in order]))
+        batches = ([self.sentences[i] for i in order[ii:jj]] for ii, jj in slices)
+        for (ii, jj), embeddings in zip(slices, map_batches(params, batcher, batches)):
+            idx = order[ii:jj]
+            embeddings = np.asarray(embeddings)
+            if self.embeddings is None:
+                self.embeddings = allocate(params, (len(self.sentences),
+                                                    embeddings.shape[1]))
+            self.embeddings[idx] = embeddings
+        logging.info('Encoded {0} unique sentences'.format(len(self)))
+        return self
+
+    def subset(self, samples):
+        # table restricted to the given sentences
+        table = EmbeddingTable(samples)
+        table.embeddings = self.embeddings[[self.index[sentence_key(sent)]
+                                            for sent in table.sentences]]
+        return table
+
+    def __call__(self, params, batch):
+        return self.embeddings[[self.index[sentence_key(sent)]
+                                for sent in batch]]
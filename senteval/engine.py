@@ -12,24 +12,22 @@ Generic sentence evaluation scripts wrapper
 '''
 from __future__ import absolute_import, division, unicode_literals
 
+import os
+import copy
 import time
+import json
+import pickle
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    wait, FIRST_COMPLETED
 
-from senteval import utils
-
-from senteval.bean_masc import BeanMascEval
-from senteval.binary import CREval, MREval, MPQAEval, SUBJEval, AmBritEval, AmazonJaEval
-from senteval.formality_ja import FormalityJaEval
-from senteval.rite import Rite2JaBCEntailmentEval
-from senteval.snli import SNLIEval
-from senteval.stylesim_ja import StyleSimJaEval
-from senteval.trec import TRECEval
-from senteval.sick import SICKRelatednessEval, SICKEntailmentEval
-from senteval.mrpc import MRPCEval
-from senteval.sts import STS12Eval, STS13Eval, STS14Eval, STS15Eval, STS16Eval, STSBenchmarkEval
-from senteval.sst import SSTEval
-from senteval.rank import ImageCaptionRetrievalEval
-from senteval.probing import *
-import os.path as osp
+from senteval import utils, timing
+from senteval.cache import EmbeddingCache, CachedBatcher
+from senteval.checkpoint import RunCheckpoint
+from senteval.encoding import EmbeddingTable, AsyncBatcher, is_async_batcher
+from senteval.registry import TASKS, load_task
 
 
 class SE(object):
@@ -40,6 +38,11 @@ class SE(object):
         params.seed = 1111 if 'seed' not in params else params.seed
 
         params.batch_size = 128 if 'batch_size' not in params else params.batch_size
+        # pack length-sorted sentences up to this many (padded) tokens per batch
+        params.max_tokens = None if 'max_tokens' not in params else params.max_tokens
+        # embeddings larger than this many bytes are memory-mapped in memmap_dir
+        params.ram_budget = None if 'ram_budget' not in params else params.ram_budget
+        params.memmap_dir = None if 'memmap_dir' not in params else params.memmap_dir
         params.nhid = 0 if 'nhid' not in params else params.nhid
         params.kfold = 5 if 'kfold' not in params else params.kfold
 
@@ -48,107 +51,420 @@ class SE(object):
 
         assert 'nhid' in params.classifier, 'Set number of hidden units in classifier config!!'
 
+        # several encoders: batcher (and optionally prepare and
+        # encoder_fingerprint) are dicts keyed by encoder name
+        self.multi = isinstance(batcher, dict)
+        self.encoders = list(batcher) if self.multi else [None]
+        batchers = batcher if self.multi else {None: batcher}
+        prepares = prepare if isinstance(prepare, dict) else \
+            {enc: prepare for enc in self.encoders}
+
+        # persistent embedding cache, keyed by the encoder fingerprint
+        params.cache_dir = None if 'cache_dir' not in params else params.cache_dir
+        params.encoder_fingerprint = None if 'encoder_fingerprint' not in params \
+            else params.encoder_fingerprint
+        fingerprints = params.encoder_fingerprint if self.multi else \
+            {None: params.encoder_fingerprint}
+        if params.cache_dir is not None:
+            assert fingerprints and all(fingerprints.get(enc) is not None
+                                        for enc in self.encoders), \
+                'Set encoder_fingerprint to use the embedding cache!!'
+        fingerprints = fingerprints or {}
+
+        # binary cache of the parsed and tokenized task data
+        params.data_cache_dir = None if 'data_cache_dir' not in params else \
+            params.data_cache_dir
+
+        # on-disk cache and number of processes of the MeCab tokenization
+        params.tokenizer_cache_dir = None if 'tokenizer_cache_dir' not in params else \
+            params.tokenizer_cache_dir
+        params.tokenizer_workers = 0 if 'tokenizer_workers' not in params else \
+            params.tokenizer_workers
+
+        # encode sentences shared by several tasks only once
+        params.dedup = False if 'dedup' not in params else params.dedup
+
+        # train classifiers in a pool of worker processes
+        params.workers = 0 if 'workers' not in params else params.workers
+        params.worker_threads = None if 'worker_threads' not in params else \
+            params.worker_threads
+        # overlap the classifier of one task with the encoding of the next
+        params.pipeline = False if 'pipeline' not in params else params.pipeline
+        # max number of encoded tasks waiting for or in classifier training
+        # while the next task is encoded
+        params.max_pending = None if 'max_pending' not in params else params.max_pending
+
+        # per-stage timing records, optionally written as JSON lines / Chrome trace
+        params.timing_jsonl = None if 'timing_jsonl' not in params else params.timing_jsonl
+        params.timing_trace = None if 'timing_trace' not in params else params.timing_trace
+        self.timings = []
+
+        # batches in flight at once with an async (or submit/collect) batcher
+        params.max_inflight = 4 if 'max_inflight' not in params else params.max_inflight
+
+        # per-task result checkpoints, to resume an interrupted run
+        params.run_dir = None if 'run_dir' not in params else params.run_dir
+        params.resume = True if 'resume' not in params else params.resume
+
         self.params = params
+        self.param_keys = list(params.keys())
+
+        # params that change how the evaluation runs but not its results
+        self.run_keys = ['cache_dir', 'data_cache_dir', 'tokenizer_cache_dir',
+                         'tokenizer_workers', 'ram_budget', 'memmap_dir', 'dedup',
+                         'workers', 'worker_threads', 'pipeline', 'max_pending',
+                         'max_inflight', 'timing_jsonl', 'timing_trace', 'run_dir',
+                         'resume']
+        # classifier settings that change how it runs but not its results
+        self.classifier_run_keys = ['n_jobs', 'cpu_threads', 'score_cache_dir']
 
-        # batcher and prepare
-        self.batcher = batcher
-        self.prepare = prepare if prepare else lambda x, y: None
+        # the batcher is not part of the params: results can only be reused
+        # for the encoder they were computed with
+        if params.run_dir is not None and params.resume:
+            assert fingerprints and all(fingerprints.get(enc) is not None
+                                        for enc in self.encoders), \
+                'Set encoder_fingerprint to resume from run_dir!!'
 
-        self.list_tasks = ['BEAN', 'MASC', 'CR', 'MR', 'MPQA', 'SUBJ', 'SST2', 'SST5', 'TREC', 'MRPC',
-                           'SICKRelatedness', 'SICKEntailment', 'STSBenchmark',
-                           'SNLI', 'ImageCaptionRetrieval', 'STS12', 'STS13',
-                           'STS14', 'STS15', 'STS16',
-                           'Length', 'WordContent', 'Depth', 'TopConstituents',
-                           'BigramShift', 'Tense', 'SubjNumber', 'ObjNumber',
-                           'OddManOut', 'CoordinationInversion', 'AmBrit', 'AmazonJa',
-                           'Rite2JaBC-Entailment', 'FormalityJa', 'StyleSimJa', 'WordContentJapanese']
+        # batcher, prepare, embedding cache and checkpoint of each encoder
+        self.encoder_state = {}
+        for enc in self.encoders:
+            batcher = batchers[enc]
+            if is_async_batcher(batcher):
+                batcher = AsyncBatcher(batcher, params.max_inflight)
+            state = utils.dotdict(batcher=batcher,
+                                  timed_batcher=timing.TimedBatcher(batcher),
+                                  prepare=prepares.get(enc) or (lambda x, y: None),
+                                  cache=None, checkpoint=None)
+            if params.cache_dir is not None:
+                state.cache = EmbeddingCache(params.cache_dir, fingerprints[enc])
+            if params.run_dir is not None:
+                run_dir = params.run_dir if enc is None else \
+                    os.path.join(params.run_dir, str(enc))
+                state.checkpoint = RunCheckpoint(run_dir,
+                                                 self.fingerprint(enc, fingerprints.get(enc)),
+                                                 resume=params.resume)
+            self.encoder_state[enc] = state
+        self.switch_encoder(self.encoders[0])
+
+        self.list_tasks = list(TASKS)
+        # tasks without a classifier stage
+        self.unsupervised_tasks = [name for name in TASKS if not TASKS[name].supervised]
+
+    def switch_encoder(self, enc):
+        # batcher, prepare, cache and checkpoint used from now on
+        state = self.encoder_state[enc]
+        self.batcher = state.batcher
+        self.timed_batcher = state.timed_batcher
+        self.prepare = state.prepare
+        self.cache = state.cache
+        self.checkpoint = state.checkpoint
+        self.params.encoder = enc
 
     def eval(self, name):
         # evaluate on evaluation [name], either takes string or list of strings
+        # with several encoders, results are keyed by encoder first
         if (isinstance(name, list)):
-            self.results = {x: self.eval(x) for x in name}
+            # tasks already finished in the run directory are not rerun
+            done = {}
+            for enc in self.encoders:
+                checkpoint = self.encoder_state[enc].checkpoint
+                for x in name if checkpoint else []:
+                    results = checkpoint.load(x)
+                    if results is not None:
+                        done[(enc, x)] = results
+            if done:
+                logging.info('Resuming: skipping finished tasks {0}'.format(
+                    [self.label(key) for key in done]))
+            todo = [x for x in name
+                    if any((enc, x) not in done for enc in self.encoders)]
+
+            if self.params.workers or self.params.pipeline:
+                results = self.eval_parallel(todo, done)
+            elif self.params.dedup or self.multi:
+                results = self.eval_dedup(todo, done)
+            else:
+                results = {(None, x): self.eval_task(x) for x in todo}
+            results.update(done)
+            if self.multi:
+                self.results = {enc: {x: results[(enc, x)] for x in name}
+                                for enc in self.encoders}
+            else:
+                self.results = {x: results[(None, x)] for x in name}
+            self.write_trace()
             return self.results
 
-        tpath = self.params.task_path
-        assert name in self.list_tasks, str(name) + ' not in ' + str(self.list_tasks)
+        if self.multi:
+            results = self.eval([name])
+            self.results = {enc: results[enc][name] for enc in self.encoders}
+            return self.results
+        if self.checkpoint:
+            results = self.checkpoint.load(name)
+            if results is not None:
+                logging.info('Resuming: {0} already finished'.format(name))
+                self.results = results
+                return self.results
+        return self.eval_task(name)
 
+    def eval_task(self, name):
         start = time.time()
 
-        # Original SentEval tasks
-        if name == 'CR':
-            self.evaluation = CREval(tpath + '/downstream/CR', seed=self.params.seed)
-        elif name == 'MR':
-            self.evaluation = MREval(tpath + '/downstream/MR', seed=self.params.seed)
-        elif name == 'MPQA':
-            self.evaluation = MPQAEval(tpath + '/downstream/MPQA', seed=self.params.seed)
-        elif name == 'SUBJ':
-            self.evaluation = SUBJEval(tpath + '/downstream/SUBJ', seed=self.params.seed)
-        elif name == 'SST2':
-            self.evaluation = SSTEval(tpath + '/downstream/SST/binary', nclasses=2, seed=self.params.seed)
-        elif name == 'SST5':
-            self.evaluation = SSTEval(tpath + '/downstream/SST/fine', nclasses=5, seed=self.params.seed)
-        elif name == 'TREC':
-            self.evaluation = TRECEval(tpath + '/downstream/TREC', seed=self.params.seed)
-        elif name == 'MRPC':
-            self.evaluation = MRPCEval(tpath + '/downstream/MRPC', seed=self.params.seed)
-        elif name == 'SICKRelatedness':
-            self.evaluation = SICKRelatednessEval(tpath + '/downstream/SICK', seed=self.params.seed)
-        elif name == 'STSBenchmark':
-            self.evaluation = STSBenchmarkEval(tpath + '/downstream/STS/STSBenchmark', seed=self.params.seed)
-        elif name == 'SICKEntailment':
-            self.evaluation = SICKEntailmentEval(tpath + '/downstream/SICK', seed=self.params.seed)
-        elif name == 'SNLI':
-            self.evaluation = SNLIEval(tpath + '/downstream/SNLI', seed=self.params.seed)
-        elif name in ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']:
-            fpath = name + '-en-test'
-            self.evaluation = eval(name + 'Eval')(tpath + '/downstream/STS/' + fpath, seed=self.params.seed)
-        elif name == 'ImageCaptionRetrieval':
-            self.evaluation = ImageCaptionRetrievalEval(tpath + '/downstream/COCO', seed=self.params.seed)
-
-        # added tasks
-        elif name == 'BEAN' or name == 'MASC':
-            self.evaluation = BeanMascEval(osp.join(tpath, 'downstream', name), name, seed=self.params.seed)
-        elif name == 'AmBrit':
-            self.evaluation = AmBritEval(tpath + '/downstream/AmBrit', seed=self.params.seed)
-        elif name == 'AmazonJa':
-            self.evaluation = AmazonJaEval(osp.join(tpath, 'downstream', name), seed=self.params.seed)
-        elif name == 'Rite2JaBC-Entailment':
-            self.evaluation = Rite2JaBCEntailmentEval(osp.join(tpath, 'downstream', 'Rite2'), seed=self.params.seed)
-        elif name == 'FormalityJa':
-            self.evaluation = FormalityJaEval(osp.join(tpath, 'downstream', name), seed=self.params.seed)
-        elif name == 'StyleSimJa':
-            self.evaluation = StyleSimJaEval(osp.join(tpath, 'downstream', name))
-        elif name == 'WordContentJapanese':
-            self.evaluation = WordContentJapaneseEval(tpath + '/probing', seed=self.params.seed)
-
-        # Probing Tasks
-        elif name == 'Length':
-            self.evaluation = LengthEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'WordContent':
-            self.evaluation = WordContentEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'Depth':
-            self.evaluation = DepthEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'TopConstituents':
-            self.evaluation = TopConstituentsEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'BigramShift':
-            self.evaluation = BigramShiftEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'Tense':
-            self.evaluation = TenseEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'SubjNumber':
-            self.evaluation = SubjNumberEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'ObjNumber':
-            self.evaluation = ObjNumberEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'OddManOut':
-            self.evaluation = OddManOutEval(tpath + '/probing', seed=self.params.seed)
-        elif name == 'CoordinationInversion':
-            self.evaluation = CoordinationInversionEval(tpath + '/probing', seed=self.params.seed)
-
-        self.params.current_task = name
-        self.evaluation.do_prepare(self.params, self.prepare)
-
-        self.results = self.evaluation.run(self.params, self.batcher)
+        recorder = timing.Recorder()
+        with timing.task(name, recorder):
+            with timing.stage('load'):
+                self.evaluation = self.load_task(name)
+            self.params.current_task = name
+            with timing.stage('prepare'):
+                self.evaluation.do_prepare(self.params, self.prepare)
+
+            try:
+                self.results = self.evaluation.run(self.params, self.get_batcher())
+            finally:
+                self.flush_cache()
+                self.timed_batcher.record()
+        self.finish_task((None, name), self.results, recorder.records)
 
         end = time.time()
         print(f'Eval {name} took {end - start} s')
 
         return self.results
+
+    def eval_dedup(self, names, done=()):
+        # every task looks its embeddings up in the table of its encoder
+        results = {}
+        for key, evaluation, table, _, records in self.encoded_tasks(names, done):
+            start = time.time()
+            self.evaluation = evaluation
+            self.params.current_task = key[1]
+            recorder = timing.Recorder()
+            with timing.task(self.label(key), recorder):
+                results[key] = self.evaluation.run(self.params, table)
+            self.finish_task(key, results[key], records + recorder.records)
+            print(f'Eval {self.label(key)} took {time.time() - start} s')
+        return results
+
+    def eval_parallel(self, names, done=()):
+        # encode here while a pool of workers trains the classifiers
+        # (of all encoders)
+        if self.params.workers:
+            params = self.worker_params()
+            pool = ProcessPoolExecutor(max_workers=self.params.workers,
+                                       mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=utils.limit_threads,
+                                       initargs=(self.params.worker_threads,))
+            max_pending = self.params.workers if self.params.max_pending is None \
+                else self.params.max_pending
+        else:
+            # pipeline: a single background thread trains task N's classifier
+            # while task N+1 is loaded and encoded
+            pool = ThreadPoolExecutor(max_workers=1)
+            max_pending = 1 if self.params.max_pending is None else self.params.max_pending
+
+        results, futures, main_records, order = {}, {}, {}, []
+
+        def collect(key):
+            results[key] = futures.pop(key).result()
+            self.finish_task(key, results[key], main_records[key] +
+                             results[key].pop('timings', []))
+            print(f'Eval {self.label(key)} finished')
+
+        with pool:
+            for key, evaluation, table, samples, records in self.encoded_tasks(names, done):
+                name = key[1]
+                order.append(key)
+                main_records[key] = records
+                if name in self.unsupervised_tasks:
+                    # no classifier stage to offload
+                    self.params.current_task = name
+                    recorder = timing.Recorder()
+                    with timing.task(self.label(key), recorder):
+                        results[key] = evaluation.run(self.params, table)
+                    self.finish_task(key, results[key], records + recorder.records)
+                    continue
+                if self.params.workers:
+                    if self.params.dedup:
+                        table = table.subset(samples)
+                    futures[key] = pool.submit(run_task, name,
+                                               utils.dotdict(params, encoder=key[0]),
+                                               table, label=self.label(key))
+                else:
+                    futures[key] = pool.submit(run_task, name, utils.dotdict(self.params),
+                                               table, evaluation, label=self.label(key))
+                logging.info('Submitted {0} to the classifier pool'.format(self.label(key)))
+
+                # bound the number of encoded tasks held in memory; up to
+                # max_pending of them train (or wait) while the next is encoded
+                while len(futures) > max_pending:
+                    wait(list(futures.values()), return_when=FIRST_COMPLETED)
+                    for finished in [x for x in futures if futures[x].done()]:
+                        collect(finished)
+
+            for key in order:
+                if key in futures:
+                    collect(key)
+        return {key: results[key] for key in order}
+
+    def encoded_tasks(self, names, done=()):
+        """
+        Loads each task once and encodes it with every encoder, yielding the
+        (encoder, task) key with the task, an EmbeddingTable of its
+        sentences, the samples it prepared and the timing records of these
+        stages. Keys in done are skipped.
+        """
+        if self.params.dedup:
+            # planning pass: load every task and collect the sentences it encodes
+            evaluations, samples, recorders = {}, {}, {}
+            for name in names:
+                recorders[name] = timing.Recorder()
+                with timing.task(name, recorders[name]):
+                    with timing.stage('load'):
+                        evaluations[name] = self.load_task(name)
+                    samples[name] = []
+                    self.params.current_task = name
+                    evaluations[name].do_prepare(self.params,
+                                                 lambda params, x: samples[name].extend(x))
+
+            # encode each unique sentence once; prepare sees all of them
+            shared = EmbeddingTable([sent for name in names for sent in samples[name]])
+            logging.info('Encoding {0} unique sentences out of {1} for {2} tasks'
+                         .format(len(shared), sum(len(x) for x in samples.values()),
+                                 len(names)))
+            for enc in self.encoders:
+                todo = [name for name in names if (enc, name) not in done]
+                if not todo:
+                    continue
+                self.switch_encoder(enc)
+                self.params.current_task = names
+                table = copy.copy(shared)
+                recorder = timing.Recorder()
+                with timing.task(self.label((enc, 'all')), recorder):
+                    with timing.stage('prepare'):
+                        self.prepare(self.params, table.sentences)
+                    try:
+                        table.encode(self.params, self.get_batcher())
+                    finally:
+                        self.flush_cache()
+                        self.timed_batcher.record()
+                self.add_timings(recorder.records)
+
+                for name in todo:
+                    # load records go with the first encoder of the task
+                    yield (enc, name), evaluations[name], table, samples[name], \
+                        recorders[name].records
+                    recorders[name] = timing.Recorder()
+        else:
+            for name in names:
+                recorder = timing.Recorder()
+                with timing.task(name, recorder):
+                    with timing.stage('load'):
+                        evaluation = self.load_task(name)
+
+                for enc in self.encoders:
+                    if (enc, name) in done:
+                        continue
+                    self.switch_encoder(enc)
+                    samples = []
+
+                    def prepare(params, x):
+                        samples.extend(x)
+                        return self.prepare(params, x)
+
+                    with timing.task(self.label((enc, name)), recorder):
+                        self.params.current_task = name
+                        with timing.stage('prepare'):
+                            evaluation.do_prepare(self.params, prepare)
+                        try:
+                            table = EmbeddingTable(samples).encode(self.params,
+                                                                   self.get_batcher())
+                        finally:
+                            self.flush_cache()
+                            self.timed_batcher.record()
+                    # load records go with the first encoder of the task
+                    yield (enc, name), evaluation, table, samples, recorder.records
+                    recorder = timing.Recorder()
+
+    def label(self, key):
+        # task name, prefixed with the encoder name when there are several
+        enc, name = key
+        return name if enc is None else '{0}/{1}'.format(enc, name)
+
+    def get_batcher(self):
+        # user (or async) batcher, timed, behind the embedding cache
+        if self.cache:
+            return CachedBatcher(self.timed_batcher, self.cache)
+        return self.timed_batcher
+
+    def add_timings(self, records):
+        self.timings.extend(records)
+        if self.params.timing_jsonl:
+            timing.write_jsonl(records, self.params.timing_jsonl)
+
+    def finish_task(self, key, results, records):
+        # stage records are returned with the results of their task
+        results['timings'] = records
+        self.add_timings(records)
+        checkpoint = self.encoder_state[key[0]].checkpoint
+        if checkpoint:
+            checkpoint.save(key[1], results)
+
+    def write_trace(self):
+        if self.params.timing_trace:
+            timing.write_chrome_trace(self.timings, self.params.timing_trace)
+
+    def fingerprint(self, enc=None, encoder_fingerprint=None):
+        # identifies the evaluation settings, including the encoder fingerprint
+        settings = {}
+        for key in self.param_keys:
+            if key in self.run_keys:
+                continue
+            value = self.params[key]
+            if key == 'classifier' and isinstance(value, dict):
+                value = {k: v for k, v in value.items()
+                         if k not in self.classifier_run_keys}
+            try:
+                settings[key] = json.loads(json.dumps(value, sort_keys=True))
+            except (TypeError, ValueError):
+                continue
+        if self.multi:
+            settings['encoder'] = enc
+            settings['encoder_fingerprint'] = encoder_fingerprint
+        return hashlib.sha1(json.dumps(settings, sort_keys=True)
+                            .encode('utf-8')).hexdigest()
+
+    def worker_params(self):
+        # user and engine params that can be sent to a worker process
+        params = utils.dotdict()
+        for key in self.param_keys:
+            try:
+                pickle.dumps(self.params[key])
+            except Exception:
+                logging.info('Param {0} is not sent to workers'.format(key))
+                continue
+            params[key] = self.params[key]
+        return params
+
+    def flush_cache(self):
+        if self.cache:
+            self.cache.flush()
+            logging.info('Embedding cache: {0} hits, {1} misses'
+                         .format(self.cache.hits, self.cache.misses))
+
+    def load_task(self, name):
+        assert name in self.list_tasks, str(name) + ' not in ' + str(self.list_tasks)
+        return load_task(name, self.params)
+
+
+def run_task(name, params, table, evaluation=None, label=None):
+    """
+    Runs the classifier stage of a task from precomputed embeddings, in a
+    worker thread or process (which first reloads the task data)
+    """
+    recorder = timing.Recorder()
+    with timing.task(label or name, recorder):
+        if evaluation is None:
+            with timing.stage('load'):
+                evaluation = load_task(name, params)
+            params.current_task = name
+            evaluation.do_prepare(params, lambda x, y: None)
+        results = evaluation.run(params, table)
+    results['timings'] = recorder.records
+    return results
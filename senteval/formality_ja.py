@@ -11,10 +11,11 @@ from __future__ import absolute_import, division, unicode_literals
 import logging
 import os
 
-import MeCab
 import numpy as np
 from sklearn.model_selection import train_test_split
 
+from senteval import japanese
+from senteval.encoding import encode
 from senteval.tools.validation import KFoldClassifier
 
 
@@ -26,8 +27,6 @@ class FormalityJaEval(object):
         logging.debug('***** Transfer task : FormalityJa *****\n\n')
 
         # using Mecab instead of Kytea because Fasttext was tokenized with Mecab (they didn't specify which dictionary)
-        self.mecab_wrapper = MeCab.Tagger("-Owakati")
-
         X_all = self.load_sentences(os.path.join(task_path, 'sentences.txt'))
         y_all = self.load_labels(os.path.join(task_path, 'formality-labels.txt'))
         X_all, X_test = X_all[:3000], X_all[3000:]
@@ -44,12 +43,9 @@ class FormalityJaEval(object):
                   self.data['test']['X']
         return prepare(params, samples)
 
-    def tokenize(self, sentence):
-        return self.mecab_wrapper.parse(sentence).split()
-
     def load_sentences(self, fpath):
         with open(fpath, encoding='utf8') as f:
-            return list(map(self.tokenize, f.read().strip().split('\n')))
+            return japanese.tokenize(f.read().strip().split('\n'))
 
     def load_labels(self, fpath):
         label2idx = {}
@@ -65,7 +61,6 @@ class FormalityJaEval(object):
 
     def run(self, params, batcher):
         embed = {'train': {}, 'test': {}}
-        bsize = params.batch_size
 
         for key in self.data:
             logging.info('Computing embedding for {0}'.format(key))
@@ -75,12 +70,7 @@ class FormalityJaEval(object):
                                  key=lambda z: (len(z[0]), z[1]))
             self.data[key]['X'], self.data[key]['y'] = map(list, zip(*sorted_data))
 
-            embed[key]['X'] = []
-            for ii in range(0, len(self.data[key]['y']), bsize):
-                batch = self.data[key]['X'][ii:ii + bsize]
-                embeddings = batcher(params, batch)
-                embed[key]['X'].append(embeddings)
-            embed[key]['X'] = np.vstack(embed[key]['X'])
+            embed[key]['X'] = encode(params, batcher, self.data[key]['X'])
             embed[key]['y'] = np.array(self.data[key]['y'])
             logging.info('Computed {0} embeddings'.format(key))
 
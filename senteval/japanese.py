@@ -0,0 +1,96 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+MeCab tokenization shared by the Japanese tasks
+
+Sentences are tokenized in chunks across a process pool, and the tokens
+are stored on disk keyed by a hash of the sentences and the MeCab
+dictionary, so that repeated runs skip tokenization.
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import io
+import pickle
+import hashlib
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from senteval.cache import atomic_write
+
+TAGGER_ARGS = '-Owakati'
+CHUNK_SIZE = 5000
+
+_local = threading.local()
+_tagger = None
+
+
+@contextmanager
+def settings(cache_dir=None, workers=0):
+    """ Cache directory and number of processes of tokenize() in this thread """
+    previous = getattr(_local, 'settings', None)
+    _local.settings = (cache_dir, workers)
+    try:
+        yield
+    finally:
+        _local.settings = previous
+
+
+def get_tagger():
+    global _tagger
+    if _tagger is None:
+        import MeCab
+        _tagger = MeCab.Tagger(TAGGER_ARGS)
+    return _tagger
+
+
+def dictionary_version():
+    import MeCab
+    info = get_tagger().dictionary_info()
+    return '{0}:{1}:{2}:{3}:{4}'.format(MeCab.VERSION, TAGGER_ARGS, info.filename,
+                                        info.version, info.size)
+
+
+def tokenize_chunk(sentences):
+    tagger = get_tagger()
+    return [tagger.parse(sentence).split() for sentence in sentences]
+
+
+def tokenize(sentences):
+    """ MeCab tokens of each sentence """
+    sentences = list(sentences)
+    cache_dir, workers = getattr(_local, 'settings', None) or (None, 0)
+
+    fpath = None
+    if cache_dir is not None:
+        h = hashlib.sha1(dictionary_version().encode('utf-8'))
+        for sentence in sentences:
+            h.update(sentence.encode('utf-8') + b'\x00')
+        fpath = os.path.join(cache_dir, h.hexdigest() + '.pkl')
+        if os.path.exists(fpath):
+            with io.open(fpath, 'rb') as f:
+                return pickle.load(f)
+
+    chunks = [sentences[i:i + CHUNK_SIZE] for i in range(0, len(sentences), CHUNK_SIZE)]
+    if workers and len(chunks) > 1:
+        logging.info('Tokenizing {0} sentences with MeCab in {1} processes'
+                     .format(len(sentences), workers))
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            tokens = [sent for chunk in pool.map(tokenize_chunk, chunks) for sent in chunk]
+    else:
+        tokens = tokenize_chunk(sentences)
+
+    if fpath is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        atomic_write(fpath, pickle.dumps(tokens, protocol=pickle.HIGHEST_PROTOCOL))
+    return tokens
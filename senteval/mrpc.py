@@ -15,6 +15,8 @@ import logging
 import numpy as np
 import io
 
+from senteval.encoding import encode
+from senteval.tools.features import PairFeatures
 from senteval.tools.validation import KFoldClassifier
 
 from sklearn.metrics import f1_score
@@ -68,25 +70,21 @@ class MRPCEval(object):
             text_data['y'] = [z for (x, y, z) in sorted_corpus]
 
             for txt_type in ['A', 'B']:
-                mrpc_embed[key][txt_type] = []
-                for ii in range(0, len(text_data['y']), params.batch_size):
-                    batch = text_data[txt_type][ii:ii + params.batch_size]
-                    embeddings = batcher(params, batch)
-                    mrpc_embed[key][txt_type].append(embeddings)
-                mrpc_embed[key][txt_type] = np.vstack(mrpc_embed[key][txt_type])
+                mrpc_embed[key][txt_type] = encode(params, batcher,
+                                                   text_data[txt_type])
             mrpc_embed[key]['y'] = np.array(text_data['y'])
             logging.info('Computed {0} embeddings'.format(key))
 
         # Train
         trainA = mrpc_embed['train']['A']
         trainB = mrpc_embed['train']['B']
-        trainF = np.c_[np.abs(trainA - trainB), trainA * trainB]
+        trainF = PairFeatures(trainA, trainB, blocks=('|u-v|', 'u*v'))
         trainY = mrpc_embed['train']['y']
 
         # Test
         testA = mrpc_embed['test']['A']
         testB = mrpc_embed['test']['B']
-        testF = np.c_[np.abs(testA - testB), testA * testB]
+        testF = PairFeatures(testA, testB, blocks=('|u-v|', 'u*v'))
         testY = mrpc_embed['test']['y']
 
         config = {'nclasses': 2, 'seed': self.seed,
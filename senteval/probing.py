@@ -16,8 +16,9 @@ import io
 import copy
 import logging
 import numpy as np
-import MeCab
 
+from senteval import japanese
+from senteval.encoding import encode
 from senteval.tools.validation import SplitClassifier
 
 
@@ -57,7 +58,6 @@ class PROBINGEval(object):
 
     def run(self, params, batcher):
         task_embed = {'train': {}, 'dev': {}, 'test': {}}
-        bsize = params.batch_size
         logging.info('Computing embeddings for train/dev/test')
         for key in self.task_data:
             # Sort to reduce padding
@@ -66,12 +66,7 @@ class PROBINGEval(object):
                                  key=lambda z: (len(z[0]), z[1]))
             self.task_data[key]['X'], self.task_data[key]['y'] = map(list, zip(*sorted_data))
 
-            task_embed[key]['X'] = []
-            for ii in range(0, len(self.task_data[key]['y']), bsize):
-                batch = self.task_data[key]['X'][ii:ii + bsize]
-                embeddings = batcher(params, batch)
-                task_embed[key]['X'].append(embeddings)
-            task_embed[key]['X'] = np.vstack(task_embed[key]['X'])
+            task_embed[key]['X'] = encode(params, batcher, self.task_data[key]['X'])
             task_embed[key]['y'] = np.array(self.task_data[key]['y'])
         logging.info('Computed embeddings')
 
@@ -120,20 +115,16 @@ class WordContentEval(PROBINGEval):
 class WordContentJapaneseEval(PROBINGEval):
     def __init__(self, task_path, seed=1111):
         task_path = os.path.join(task_path, 'word_content_japanese.txt')
-        self.mecab_wrapper = MeCab.Tagger("-Owakati")
         # labels: 200 target words
         PROBINGEval.__init__(self, 'WordContent', task_path, seed)
 
-    def tokenize(self, sentence):
-        return self.mecab_wrapper.parse(sentence).split()
-
     def loadFile(self, fpath):
         self.tok2split = {'tr': 'train', 'va': 'dev', 'te': 'test'}
         with io.open(fpath, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.rstrip().split('\t')
-                self.task_data[self.tok2split[line[0]]]['X'].append(self.tokenize(line[-1]))
-                self.task_data[self.tok2split[line[0]]]['y'].append(line[1])
+            lines = [line.rstrip().split('\t') for line in f]
+        for line, tokens in zip(lines, japanese.tokenize(line[-1] for line in lines)):
+            self.task_data[self.tok2split[line[0]]]['X'].append(tokens)
+            self.task_data[self.tok2split[line[0]]]['y'].append(line[1])
 
         labels = sorted(np.unique(self.task_data['train']['y']))
         self.tok2label = dict(zip(labels, range(len(labels))))
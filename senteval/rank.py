@@ -20,6 +20,8 @@ try:
 except ImportError:
     import pickle
 
+from senteval import timing
+from senteval.encoding import encode
 from senteval.tools.ranking import ImageSentenceRankingPytorch
 
 
@@ -43,7 +45,7 @@ class ImageCaptionRetrievalEval(object):
 
         for split in ['train', 'valid', 'test']:
             list_sent = []
-            list_img_feat = []
+            list_img_idx = []
             if sys.version_info < (3, 0):
                 with open(os.path.join(fpath, split + '.pkl')) as f:
                     cocodata = pickle.load(f)
@@ -58,43 +60,42 @@ class ImageCaptionRetrievalEval(object):
                     sent = cocodata['captions'][captkey]['cleaned_caption']
                     sent += ' .'  # add punctuation to end of sentence in COCO
                     list_sent.append(sent.encode('utf-8').split())
-                    list_img_feat.append(cocodata['features'][imgkey])
-            assert len(list_sent) == len(list_img_feat) and \
+                    list_img_idx.append(imgkey)
+            assert len(list_sent) == len(list_img_idx) and \
                 len(list_sent) % 5 == 0
-            list_img_feat = np.array(list_img_feat).astype('float32')
-            coco[split] = {'sent': list_sent, 'imgfeat': list_img_feat}
+            # image features are stored once per image, captions point to
+            # their image (memory-mapped when loaded from the data cache)
+            img_feat = np.asarray(cocodata['features'], dtype=np.float32)
+            del cocodata
+            coco[split] = {'sent': list_sent, 'imgfeat': img_feat,
+                           'imgidx': np.array(list_img_idx, dtype=np.int64)}
         return coco['train'], coco['valid'], coco['test']
 
     def run(self, params, batcher):
-        coco_embed = {'train': {'sentfeat': [], 'imgfeat': []},
-                      'dev': {'sentfeat': [], 'imgfeat': []},
-                      'test': {'sentfeat': [], 'imgfeat': []}}
+        coco_embed = {'train': {}, 'dev': {}, 'test': {}}
 
         for key in self.coco_data:
             logging.info('Computing embedding for {0}'.format(key))
             # Sort to reduce padding
-            self.coco_data[key]['sent'] = np.array(self.coco_data[key]['sent'])
-            self.coco_data[key]['sent'], idx_sort = np.sort(self.coco_data[key]['sent']), np.argsort(self.coco_data[key]['sent'])
-            idx_unsort = np.argsort(idx_sort)
-
-            coco_embed[key]['X'] = []
-            nsent = len(self.coco_data[key]['sent'])
-            for ii in range(0, nsent, params.batch_size):
-                batch = self.coco_data[key]['sent'][ii:ii + params.batch_size]
-                embeddings = batcher(params, batch)
-                coco_embed[key]['sentfeat'].append(embeddings)
-            coco_embed[key]['sentfeat'] = np.vstack(coco_embed[key]['sentfeat'])[idx_unsort]
-            coco_embed[key]['imgfeat'] = np.array(self.coco_data[key]['imgfeat'])
+            sents = self.coco_data[key]['sent']
+            idx_sort = sorted(range(len(sents)), key=lambda i: sents[i])
+
+            coco_embed[key]['sentfeat'] = encode(params, batcher, sents,
+                                                 order=idx_sort)
+            coco_embed[key]['imgfeat'] = self.coco_data[key]['imgfeat']
+            coco_embed[key]['imgidx'] = self.coco_data[key]['imgidx']
             logging.info('Computed {0} embeddings'.format(key))
 
-        config = {'seed': self.seed, 'projdim': 1000, 'margin': 0.2}
+        config = {'seed': self.seed, 'projdim': 1000, 'margin': 0.2,
+                  'device': params.classifier.get('device')}
         clf = ImageSentenceRankingPytorch(train=coco_embed['train'],
                                           valid=coco_embed['dev'],
                                           test=coco_embed['test'],
                                           config=config)
 
-        bestdevscore, r1_i2t, r5_i2t, r10_i2t, medr_i2t, \
-            r1_t2i, r5_t2i, r10_t2i, medr_t2i = clf.run()
+        with timing.stage('fit'):
+            bestdevscore, r1_i2t, r5_i2t, r10_i2t, medr_i2t, \
+                r1_t2i, r5_t2i, r10_t2i, medr_t2i = clf.run()
 
         logging.debug("\nTest scores | Image to text: \
             {0}, {1}, {2}, {3}".format(r1_i2t, r5_i2t, r10_i2t, medr_i2t))
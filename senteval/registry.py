@@ -0,0 +1,98 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+Registry of transfer tasks
+
+Task modules are only imported when one of their tasks is loaded, so that
+e.g. running STS12 does not need MeCab, torch or scikit-learn.
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import importlib
+import os.path as osp
+from collections import namedtuple
+
+from senteval import japanese
+from senteval.datacache import TaskDataCache
+
+
+# module, class, data path relative to task_path, extra constructor kwargs,
+# whether the constructor takes a seed, whether the task trains a classifier
+# and whether its data is tokenized with MeCab
+TaskSpec = namedtuple('TaskSpec', ['module', 'cls', 'path', 'kwargs',
+                                   'seed', 'supervised', 'mecab'])
+
+
+def task(module, cls, path, seed=True, supervised=True, mecab=False, **kwargs):
+    return TaskSpec('senteval.' + module, cls, path, kwargs, seed, supervised,
+                    mecab)
+
+
+TASKS = {
+    # Original SentEval tasks
+    'CR': task('binary', 'CREval', 'downstream/CR'),
+    'MR': task('binary', 'MREval', 'downstream/MR'),
+    'MPQA': task('binary', 'MPQAEval', 'downstream/MPQA'),
+    'SUBJ': task('binary', 'SUBJEval', 'downstream/SUBJ'),
+    'SST2': task('sst', 'SSTEval', 'downstream/SST/binary', nclasses=2),
+    'SST5': task('sst', 'SSTEval', 'downstream/SST/fine', nclasses=5),
+    'TREC': task('trec', 'TRECEval', 'downstream/TREC'),
+    'MRPC': task('mrpc', 'MRPCEval', 'downstream/MRPC'),
+    'SICKRelatedness': task('sick', 'SICKRelatednessEval', 'downstream/SICK'),
+    'SICKEntailment': task('sick', 'SICKEntailmentEval', 'downstream/SICK'),
+    'STSBenchmark': task('sts', 'STSBenchmarkEval', 'downstream/STS/STSBenchmark'),
+    'SNLI': task('snli', 'SNLIEval', 'downstream/SNLI'),
+    'STS12': task('sts', 'STS12Eval', 'downstream/STS/STS12-en-test', supervised=False),
+    'STS13': task('sts', 'STS13Eval', 'downstream/STS/STS13-en-test', supervised=False),
+    'STS14': task('sts', 'STS14Eval', 'downstream/STS/STS14-en-test', supervised=False),
+    'STS15': task('sts', 'STS15Eval', 'downstream/STS/STS15-en-test', supervised=False),
+    'STS16': task('sts', 'STS16Eval', 'downstream/STS/STS16-en-test', supervised=False),
+    'ImageCaptionRetrieval': task('rank', 'ImageCaptionRetrievalEval', 'downstream/COCO'),
+
+    # added tasks
+    'BEAN': task('bean_masc', 'BeanMascEval', 'downstream/BEAN', task='BEAN'),
+    'MASC': task('bean_masc', 'BeanMascEval', 'downstream/MASC', task='MASC'),
+    'AmBrit': task('binary', 'AmBritEval', 'downstream/AmBrit'),
+    'AmazonJa': task('binary', 'AmazonJaEval', 'downstream/AmazonJa', mecab=True),
+    'Rite2JaBC-Entailment': task('rite', 'Rite2JaBCEntailmentEval', 'downstream/Rite2',
+                                 mecab=True),
+    'FormalityJa': task('formality_ja', 'FormalityJaEval', 'downstream/FormalityJa',
+                        mecab=True),
+    'StyleSimJa': task('stylesim_ja', 'StyleSimJaEval', 'downstream/StyleSimJa',
+                       seed=False, supervised=False, mecab=True),
+    'WordContentJapanese': task('probing', 'WordContentJapaneseEval', 'probing',
+                                mecab=True),
+
+    # Probing Tasks
+    'Length': task('probing', 'LengthEval', 'probing'),
+    'WordContent': task('probing', 'WordContentEval', 'probing'),
+    'Depth': task('probing', 'DepthEval', 'probing'),
+    'TopConstituents': task('probing', 'TopConstituentsEval', 'probing'),
+    'BigramShift': task('probing', 'BigramShiftEval', 'probing'),
+    'Tense': task('probing', 'TenseEval', 'probing'),
+    'SubjNumber': task('probing', 'SubjNumberEval', 'probing'),
+    'ObjNumber': task('probing', 'ObjNumberEval', 'probing'),
+    'OddManOut': task('probing', 'OddManOutEval', 'probing'),
+    'CoordinationInversion': task('probing', 'CoordinationInversionEval', 'probing'),
+}
+
+
+def load_task(name, params):
+    """ Imports the module of task [name] and builds its evaluation object """
+    assert name in TASKS, str(name) + ' not in ' + str(list(TASKS))
+    spec = TASKS[name]
+    cls = getattr(importlib.import_module(spec.module), spec.cls)
+    kwargs = dict(spec.kwargs)
+    if spec.seed:
+        kwargs['seed'] = params.seed
+    path = osp.join(params.task_path, spec.path)
+    # MeCab tokenization of the Japanese tasks
+    with japanese.settings(params.tokenizer_cache_dir, params.tokenizer_workers):
+        if params.data_cache_dir:
+            return TaskDataCache(params.data_cache_dir).load(spec, cls, path, kwargs)
+        return cls(path, **kwargs)
@@ -5,9 +5,11 @@ import logging
 import os
 import xml.etree.ElementTree as ET
 
-import MeCab
 import numpy as np
 
+from senteval import japanese
+from senteval.encoding import encode
+from senteval.tools.features import PairFeatures
 from senteval.tools.validation import InnerKFoldClassifier
 
 
@@ -15,7 +17,6 @@ class Rite2JaBCEntailmentEval:
     def __init__(self, task_path, seed=1111):
         logging.debug('***** Transfer task : Rite2JaBC-Entailment*****\n\n')
         self.seed = seed
-        self.mecab_wrapper = MeCab.Tagger("-Owakati")
         dev = self.loadFile(os.path.join(task_path, 'RITE2_JA_dev_bc', 'RITE2_JA_dev_bc.xml'))
         test = self.loadFile(os.path.join(task_path, 'RITE2_JA_testlabel_bc', 'RITE2_JA_testlabel_bc.xml'))
         train = {}
@@ -25,9 +26,6 @@ class Rite2JaBCEntailmentEval:
         # use dev as test together to do cross validation
         self.data = {'train': train}
 
-    def tokenize(self, sentence):
-        return self.mecab_wrapper.parse(sentence).split()
-
     def loadFile(self, fpath):
         label2id = {'Y': 0, 'N': 1}
         data = {'X_A': [], 'X_B': [], 'y': []}
@@ -37,8 +35,8 @@ class Rite2JaBCEntailmentEval:
 
         for pair in root:
             data['y'].append(pair.attrib['label'])
-            data['X_A'].append(self.tokenize(pair[0].text))
-            data['X_B'].append(self.tokenize(pair[1].text))
+        data['X_A'] = japanese.tokenize(pair[0].text for pair in root)
+        data['X_B'] = japanese.tokenize(pair[1].text for pair in root)
 
         data['y'] = [label2id[s] for s in data['y']]
         return data
@@ -50,7 +48,6 @@ class Rite2JaBCEntailmentEval:
 
     def run(self, params, batcher):
         embed = {'train': {}}
-        bsize = params.batch_size
 
         for key in self.data:
             logging.info('Computing embedding for {0}'.format(key))
@@ -65,17 +62,12 @@ class Rite2JaBCEntailmentEval:
             self.data[key]['y'] = [z for (x, y, z) in sorted_corpus]
 
             for txt_type in ['X_A', 'X_B']:
-                embed[key][txt_type] = []
-                for ii in range(0, len(self.data[key]['y']), bsize):
-                    batch = self.data[key][txt_type][ii:ii + bsize]
-                    embeddings = batcher(params, batch)
-                    embed[key][txt_type].append(embeddings)
-                embed[key][txt_type] = np.vstack(embed[key][txt_type])
+                embed[key][txt_type] = encode(params, batcher, self.data[key][txt_type])
             logging.info('Computed {0} embeddings'.format(key))
 
         trainA = embed['train']['X_A']
         trainB = embed['train']['X_B']
-        trainF = np.c_[np.abs(trainA - trainB), trainA * trainB]
+        trainF = PairFeatures(trainA, trainB, blocks=('|u-v|', 'u*v'))
         trainY = np.array(self.data['train']['y'])
 
         config = {'nclasses': 2, 'seed': self.seed,
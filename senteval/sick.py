@@ -18,6 +18,9 @@ import numpy as np
 from sklearn.metrics import mean_squared_error
 from scipy.stats import pearsonr, spearmanr
 
+from senteval import timing
+from senteval.encoding import encode
+from senteval.tools.features import PairFeatures
 from senteval.tools.relatedness import RelatednessPytorch
 from senteval.tools.validation import SplitClassifier
 
@@ -57,7 +60,6 @@ class SICKRelatednessEval(object):
 
     def run(self, params, batcher):
         sick_embed = {'train': {}, 'dev': {}, 'test': {}}
-        bsize = params.batch_size
 
         for key in self.sick_data:
             logging.info('Computing embedding for {0}'.format(key))
@@ -72,41 +74,39 @@ class SICKRelatednessEval(object):
             self.sick_data[key]['y'] = [z for (x, y, z) in sorted_corpus]
 
             for txt_type in ['X_A', 'X_B']:
-                sick_embed[key][txt_type] = []
-                for ii in range(0, len(self.sick_data[key]['y']), bsize):
-                    batch = self.sick_data[key][txt_type][ii:ii + bsize]
-                    embeddings = batcher(params, batch)
-                    sick_embed[key][txt_type].append(embeddings)
-                sick_embed[key][txt_type] = np.vstack(sick_embed[key][txt_type])
+                sick_embed[key][txt_type] = encode(params, batcher,
+                                                   self.sick_data[key][txt_type])
             sick_embed[key]['y'] = np.array(self.sick_data[key]['y'])
             logging.info('Computed {0} embeddings'.format(key))
 
         # Train
         trainA = sick_embed['train']['X_A']
         trainB = sick_embed['train']['X_B']
-        trainF = np.c_[np.abs(trainA - trainB), trainA * trainB]
+        trainF = PairFeatures(trainA, trainB, blocks=('|u-v|', 'u*v'))
         trainY = self.encode_labels(self.sick_data['train']['y'])
 
         # Dev
         devA = sick_embed['dev']['X_A']
         devB = sick_embed['dev']['X_B']
-        devF = np.c_[np.abs(devA - devB), devA * devB]
+        devF = PairFeatures(devA, devB, blocks=('|u-v|', 'u*v'))
         devY = self.encode_labels(self.sick_data['dev']['y'])
 
         # Test
         testA = sick_embed['test']['X_A']
         testB = sick_embed['test']['X_B']
-        testF = np.c_[np.abs(testA - testB), testA * testB]
+        testF = PairFeatures(testA, testB, blocks=('|u-v|', 'u*v'))
         testY = self.encode_labels(self.sick_data['test']['y'])
 
-        config = {'seed': self.seed, 'nclasses': 5}
+        config = {'seed': self.seed, 'nclasses': 5,
+                  'device': params.classifier.get('device')}
         clf = RelatednessPytorch(train={'X': trainF, 'y': trainY},
                                  valid={'X': devF, 'y': devY},
                                  test={'X': testF, 'y': testY},
                                  devscores=self.sick_data['dev']['y'],
                                  config=config)
 
-        devpr, yhat = clf.run()
+        with timing.stage('fit'):
+            devpr, yhat = clf.run()
 
         pr = pearsonr(yhat, self.sick_data['test']['y'])[0]
         sr = spearmanr(yhat, self.sick_data['test']['y'])[0]
@@ -161,7 +161,6 @@ class SICKEntailmentEval(SICKRelatednessEval):
 
     def run(self, params, batcher):
         sick_embed = {'train': {}, 'dev': {}, 'test': {}}
-        bsize = params.batch_size
 
         for key in self.sick_data:
             logging.info('Computing embedding for {0}'.format(key))
@@ -176,30 +175,26 @@ class SICKEntailmentEval(SICKRelatednessEval):
             self.sick_data[key]['y'] = [z for (x, y, z) in sorted_corpus]
 
             for txt_type in ['X_A', 'X_B']:
-                sick_embed[key][txt_type] = []
-                for ii in range(0, len(self.sick_data[key]['y']), bsize):
-                    batch = self.sick_data[key][txt_type][ii:ii + bsize]
-                    embeddings = batcher(params, batch)
-                    sick_embed[key][txt_type].append(embeddings)
-                sick_embed[key][txt_type] = np.vstack(sick_embed[key][txt_type])
+                sick_embed[key][txt_type] = encode(params, batcher,
+                                                   self.sick_data[key][txt_type])
             logging.info('Computed {0} embeddings'.format(key))
 
         # Train
         trainA = sick_embed['train']['X_A']
         trainB = sick_embed['train']['X_B']
-        trainF = np.c_[np.abs(trainA - trainB), trainA * trainB]
+        trainF = PairFeatures(trainA, trainB, blocks=('|u-v|', 'u*v'))
         trainY = np.array(self.sick_data['train']['y'])
 
         # Dev
         devA = sick_embed['dev']['X_A']
         devB = sick_embed['dev']['X_B']
-        devF = np.c_[np.abs(devA - devB), devA * devB]
+        devF = PairFeatures(devA, devB, blocks=('|u-v|', 'u*v'))
         devY = np.array(self.sick_data['dev']['y'])
 
         # Test
         testA = sick_embed['test']['X_A']
         testB = sick_embed['test']['X_B']
-        testF = np.c_[np.abs(testA - testB), testA * testB]
+        testF = PairFeatures(testA, testB, blocks=('|u-v|', 'u*v'))
         testY = np.array(self.sick_data['test']['y'])
 
         config = {'nclasses': 3, 'seed': self.seed,
@@ -15,8 +15,9 @@ import os
 import io
 import copy
 import logging
-import numpy as np
 
+from senteval.encoding import allocate, map_pairs
+from senteval.tools.features import PairFeatures
 from senteval.tools.validation import SplitClassifier
 
 
@@ -77,21 +78,21 @@ class SNLIEval(object):
                 self.y[key] = []
 
             input1, input2, mylabels = self.data[key]
-            enc_input = []
+            emb1, emb2 = None, None
             n_labels = len(mylabels)
-            for ii in range(0, n_labels, params.batch_size):
-                batch1 = input1[ii:ii + params.batch_size]
-                batch2 = input2[ii:ii + params.batch_size]
-
-                if len(batch1) == len(batch2) and len(batch1) > 0:
-                    enc1 = batcher(params, batch1)
-                    enc2 = batcher(params, batch2)
-                    enc_input.append(np.hstack((enc1, enc2, enc1 * enc2,
-                                                np.abs(enc1 - enc2))))
-                if (ii*params.batch_size) % (20000*params.batch_size) == 0:
+            for ii, jj, enc1, enc2 in map_pairs(params, batcher, input1, input2):
+                if emb1 is None:
+                    emb1 = allocate(params, (n_labels, enc1.shape[1]))
+                    emb2 = allocate(params, (n_labels, enc2.shape[1]))
+                emb1[ii:jj] = enc1
+                emb2[ii:jj] = enc2
+                # jj pairs are encoded: log every 20000, whatever the
+                # batch sizes (max_tokens packs batches of varying size)
+                if ii // 20000 < jj // 20000:
                     logging.info("PROGRESS (encoding): %.2f%%" %
-                                 (100 * ii / n_labels))
-            self.X[key] = np.vstack(enc_input)
+                                 (100 * jj / n_labels))
+            # the classifier builds the pair features minibatch by minibatch
+            self.X[key] = PairFeatures(emb1, emb2)
             self.y[key] = [dico_label[y] for y in mylabels]
 
         config = {'nclasses': 3, 'seed': self.seed,
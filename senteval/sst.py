@@ -16,6 +16,7 @@ import io
 import logging
 import numpy as np
 
+from senteval.encoding import encode
 from senteval.tools.validation import SplitClassifier
 
 
@@ -56,7 +57,6 @@ class SSTEval(object):
 
     def run(self, params, batcher):
         sst_embed = {'train': {}, 'dev': {}, 'test': {}}
-        bsize = params.batch_size
 
         for key in self.sst_data:
             logging.info('Computing embedding for {0}'.format(key))
@@ -66,12 +66,7 @@ class SSTEval(object):
                                  key=lambda z: (len(z[0]), z[1]))
             self.sst_data[key]['X'], self.sst_data[key]['y'] = map(list, zip(*sorted_data))
 
-            sst_embed[key]['X'] = []
-            for ii in range(0, len(self.sst_data[key]['y']), bsize):
-                batch = self.sst_data[key]['X'][ii:ii + bsize]
-                embeddings = batcher(params, batch)
-                sst_embed[key]['X'].append(embeddings)
-            sst_embed[key]['X'] = np.vstack(sst_embed[key]['X'])
+            sst_embed[key]['X'] = encode(params, batcher, self.sst_data[key]['X'])
             sst_embed[key]['y'] = np.array(self.sst_data[key]['y'])
             logging.info('Computed {0} embeddings'.format(key))
 
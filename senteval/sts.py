@@ -20,6 +20,7 @@ import logging
 from scipy.stats import spearmanr, pearsonr
 
 from senteval.utils import cosine
+from senteval.encoding import map_pairs
 from senteval.sick import SICKRelatednessEval
 
 
@@ -39,8 +40,9 @@ class STSEval(object):
             not_empty_idx = raw_scores != ''
 
             gs_scores = [float(x) for x in raw_scores[not_empty_idx]]
-            sent1 = np.array([s.split() for s in sent1])[not_empty_idx]
-            sent2 = np.array([s.split() for s in sent2])[not_empty_idx]
+            # (a ragged np.array of token lists is an error with recent numpy)
+            sent1 = [s.split() for s, keep in zip(sent1, not_empty_idx) if keep]
+            sent2 = [s.split() for s, keep in zip(sent2, not_empty_idx) if keep]
             # sort data by length to minimize padding in batcher
             sorted_data = sorted(zip(sent1, sent2, gs_scores),
                                  key=lambda z: (len(z[0]), len(z[1]), z[2]))
@@ -61,18 +63,11 @@ class STSEval(object):
         for dataset in self.datasets:
             sys_scores = []
             input1, input2, gs_scores = self.data[dataset]
-            for ii in range(0, len(gs_scores), params.batch_size):
-                batch1 = input1[ii:ii + params.batch_size]
-                batch2 = input2[ii:ii + params.batch_size]
-
-                # we assume get_batch already throws out the faulty ones
-                if len(batch1) == len(batch2) and len(batch1) > 0:
-                    enc1 = batcher(params, batch1)
-                    enc2 = batcher(params, batch2)
-
-                    for kk in range(enc2.shape[0]):
-                        sys_score = self.similarity(enc1[kk], enc2[kk])
-                        sys_scores.append(sys_score)
+            # we assume get_batch already throws out the faulty ones
+            for _, _, enc1, enc2 in map_pairs(params, batcher, input1, input2):
+                for kk in range(enc2.shape[0]):
+                    sys_score = self.similarity(enc1[kk], enc2[kk])
+                    sys_scores.append(sys_score)
 
             results[dataset] = {'pearson': pearsonr(sys_scores, gs_scores),
                                 'spearman': spearmanr(sys_scores, gs_scores),
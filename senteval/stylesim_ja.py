@@ -3,16 +3,15 @@ import logging
 import math
 import os.path as osp
 
-import MeCab
-import numpy as np
 from scipy import spatial
 from scipy.stats import spearmanr
 
+from senteval import japanese
+from senteval.encoding import encode
+
 
 class StyleSimJaEval:
     def __init__(self, task_path):
-        self.mecab_wrapper = MeCab.Tagger("-Owakati")
-
         self.sents = {}
         for sp in ['dev', 'test']:
             sent1, sent2, sim = self.load_file(osp.join(task_path, f'stylistic_sentsim_{sp}.csv'))
@@ -24,14 +23,11 @@ class StyleSimJaEval:
             reader = csv.reader(f)
             next(reader)  # skip the header
             for row in reader:
-                sent1.append(self.tokenize(row[0]))
-                sent2.append(self.tokenize(row[1]))
+                sent1.append(row[0])
+                sent2.append(row[1])
                 sim.append(float(row[4]))
 
-        return sent1, sent2, sim
-
-    def tokenize(self, sentence):
-        return self.mecab_wrapper.parse(sentence).split()
+        return japanese.tokenize(sent1), japanese.tokenize(sent2), sim
 
     def do_prepare(self, params, prepare):
         samples = []
@@ -44,7 +40,6 @@ class StyleSimJaEval:
 
         for sp in ['dev', 'test']:
             embed = {}
-            bsize = params.batch_size
 
             logging.info('Computing embeddings')
             # Sort to reduce padding
@@ -56,12 +51,7 @@ class StyleSimJaEval:
             sents = {'1': sents1, '2': sents2}
 
             for key in sents.keys():
-                embed[key] = []
-                for ii in range(0, len(sents[key]), bsize):
-                    batch = sents[key][ii:ii + bsize]
-                    embeddings = batcher(params, batch)
-                    embed[key].append(embeddings)
-                embed[key] = np.vstack(embed[key])
+                embed[key] = encode(params, batcher, sents[key])
                 logging.info('Computed {0} embeddings'.format(key))
 
             embed_dist = []
@@ -0,0 +1,153 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+'''
+Per-stage timing of the evaluation
+
+A Recorder collects one record per stage (load, prepare, encode, search,
+fit, score) of a task with its wall and CPU time. Stages are recorded by
+whatever code runs inside a `task` context, in the current thread.
+
+CPU time is that of the recording thread (time.thread_time), so that
+stages running at the same time in other threads (e.g. the classifier of
+the pipeline) are not counted; work done in helper threads of a library,
+such as the intra-op threads of torch, is not counted either.
+'''
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import io
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class Recorder(object):
+    def __init__(self):
+        self.records = []
+
+    def add(self, task, stage, start, wall, cpu, **extra):
+        record = {'task': task, 'stage': stage, 'start': start,
+                  'wall': wall, 'cpu': cpu, 'pid': os.getpid(),
+                  'tid': threading.current_thread().ident}
+        record.update(extra)
+        self.records.append(record)
+        return record
+
+
+@contextmanager
+def task(name, recorder):
+    """ Stages recorded in this thread go to recorder, under task name """
+    previous = getattr(_local, 'task', None), getattr(_local, 'recorder', None)
+    _local.task, _local.recorder = name, recorder
+    try:
+        yield recorder
+    finally:
+        _local.task, _local.recorder = previous
+
+
+def record(stage, start, wall, cpu, **extra):
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is not None:
+        return recorder.add(_local.task, stage, start, wall, cpu, **extra)
+
+
+@contextmanager
+def stage(name, **extra):
+    """ Times the enclosed block; callers may add fields to the yielded dict """
+    start, cpu = time.time(), time.thread_time()
+    try:
+        yield extra
+    finally:
+        record(name, start, time.time() - start, time.thread_time() - cpu,
+               **extra)
+
+
+class TimedBatcher(object):
+    """
+    Wraps a batcher to accumulate encoding time and throughput, reported
+    as a single 'encode' stage.
+    """
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.reset()
+
+    def reset(self):
+        self.start = None
+        self.wall, self.cpu = 0., 0.
+        self.nbatches, self.nsentences, self.ntokens = 0, 0, 0
+
+    def __call__(self, params, batch):
+        start, cpu = time.time(), time.thread_time()
+        if self.start is None:
+            self.start = start
+        embeddings = self.batcher(params, batch)
+        self.wall += time.time() - start
+        self.cpu += time.thread_time() - cpu
+        self.count(batch)
+        return embeddings
+
+    def map(self, params, batches):
+        # time spent waiting for each result of an (async) batcher
+        def counted():
+            for batch in batches:
+                self.count(batch)
+                yield batch
+        if hasattr(self.batcher, 'map'):
+            results = self.batcher.map(params, counted())
+        else:
+            results = (self.batcher(params, batch) for batch in counted())
+        while True:
+            start, cpu = time.time(), time.thread_time()
+            if self.start is None:
+                self.start = start
+            try:
+                embeddings = next(results)
+            except StopIteration:
+                return
+            finally:
+                self.wall += time.time() - start
+                self.cpu += time.thread_time() - cpu
+            yield embeddings
+
+    def count(self, batch):
+        self.nbatches += 1
+        self.nsentences += len(batch)
+        self.ntokens += sum(len(sent) for sent in batch)
+
+    def record(self):
+        if self.start is not None:
+            wall = max(self.wall, 1e-9)
+            record('encode', self.start, self.wall, self.cpu,
+                   batches=self.nbatches, sentences=self.nsentences,
+                   tokens=self.ntokens,
+                   sentences_per_sec=self.nsentences / wall,
+                   tokens_per_sec=self.ntokens / wall)
+        self.reset()
+
+
+def write_jsonl(records, fpath):
+    with io.open(fpath, 'a', encoding='utf-8') as f:
+        for rec in records:
+            f.write(json.dumps(rec, default=str) + '\n')
+
+
+def write_chrome_trace(records, fpath):
+    """ Complete events ('X') loadable in chrome://tracing or Perfetto """
+    events = []
+    for rec in records:
+        args = {k: v for k, v in rec.items()
+                if k not in ['task', 'stage', 'start', 'wall', 'pid', 'tid']}
+        events.append({'name': rec['stage'], 'cat': str(rec['task']),
+                       'ph': 'X', 'ts': rec['start'] * 1e6,
+                       'dur': rec['wall'] * 1e6, 'pid': rec['pid'],
+                       'tid': rec['tid'], 'args': args})
+    with io.open(fpath, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events}, f, default=str)
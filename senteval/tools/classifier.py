@@ -12,18 +12,29 @@ Classifiers include Logistic Regression and MLP
 
 from __future__ import absolute_import, division, unicode_literals
 
+import functools
 import numpy as np
-import copy
 from senteval import utils
+from senteval.tools.features import PairFeatures, take
 
 import torch
 from torch import nn
+import torch.optim as optim
 import torch.nn.functional as F
 
 
+def with_threads(fit):
+    # runs fit with the cpu_threads of the classifier
+    @functools.wraps(fit)
+    def scoped_fit(self, *args, **kwargs):
+        with utils.torch_threads(self.cpu_threads):
+            return fit(self, *args, **kwargs)
+    return scoped_fit
+
+
 class PyTorchClassifier(object):
     def __init__(self, inputdim, nclasses, l2reg=0., batch_size=64, seed=1111,
-                 cudaEfficient=False):
+                 cudaEfficient=False, device=None, cpu_threads=None):
         # fix seed
         np.random.seed(seed)
         torch.manual_seed(seed)
@@ -34,6 +45,13 @@ class PyTorchClassifier(object):
         self.l2reg = l2reg
         self.batch_size = batch_size
         self.cudaEfficient = cudaEfficient
+        self.device = utils.get_device(device)
+        # cudaEfficient: the data stays on the host, minibatches are moved
+        self.data_device = torch.device('cpu') if cudaEfficient else self.device
+        # intra-op threads of torch during fit(), when training on cpu
+        self.cpu_threads = cpu_threads if self.device.type == 'cpu' else None
+        # rows per forward pass at inference
+        self.eval_batch_size = max(batch_size, 1024)
 
     def prepare_split(self, X, y, validation_data=None, validation_split=None):
         # Preparing validation data
@@ -45,18 +63,22 @@ class PyTorchClassifier(object):
             permutation = np.random.permutation(len(X))
             trainidx = permutation[int(validation_split * len(X)):]
             devidx = permutation[0:int(validation_split * len(X))]
-            trainX, trainy = X[trainidx], y[trainidx]
-            devX, devy = X[devidx], y[devidx]
+            trainX, trainy = take(X, trainidx), y[trainidx]
+            devX, devy = take(X, devidx), y[devidx]
 
-        device = torch.device('cpu') if self.cudaEfficient else torch.device('cuda')
+        device = self.data_device
 
-        trainX = torch.from_numpy(trainX).to(device, dtype=torch.float32)
-        trainy = torch.from_numpy(trainy).to(device, dtype=torch.int64)
-        devX = torch.from_numpy(devX).to(device, dtype=torch.float32)
-        devy = torch.from_numpy(devy).to(device, dtype=torch.int64)
+        # PairFeatures are kept as is, and built minibatch by minibatch
+        if not isinstance(trainX, PairFeatures):
+            trainX = torch.from_numpy(trainX).to(device, dtype=torch.float32)
+        trainy = torch.from_numpy(np.asarray(trainy)).to(device, dtype=torch.int64)
+        if not isinstance(devX, PairFeatures):
+            devX = torch.from_numpy(devX).to(device, dtype=torch.float32)
+        devy = torch.from_numpy(np.asarray(devy)).to(device, dtype=torch.int64)
 
         return trainX, trainy, devX, devy
 
+    @with_threads
     def fit(self, X, y, validation_data=None, validation_split=None,
             early_stop=True):
         self.nepoch = 0
@@ -69,17 +91,18 @@ class PyTorchClassifier(object):
                                                         validation_split)
 
         # Training
+        bestmodel = utils.ModelSnapshot(self.model)
         while not stop_train and self.nepoch <= self.max_epoch:
             self.trainepoch(trainX, trainy, epoch_size=self.epoch_size)
             accuracy = self.score(devX, devy)
             if accuracy > bestaccuracy:
                 bestaccuracy = accuracy
-                bestmodel = copy.deepcopy(self.model)
+                bestmodel.save()
             elif early_stop:
                 if early_stop_count >= self.tenacity:
                     stop_train = True
                 early_stop_count += 1
-        self.model = bestmodel
+        bestmodel.restore()
         return bestaccuracy
 
     def trainepoch(self, X, y, epoch_size=1):
@@ -89,14 +112,18 @@ class PyTorchClassifier(object):
             all_costs = []
             for i in range(0, len(X), self.batch_size):
                 # forward
-                idx = torch.from_numpy(permutation[i:i + self.batch_size]).long().to(X.device)
+                batch = permutation[i:i + self.batch_size]
+                idx = torch.from_numpy(batch).long().to(y.device)
 
-                Xbatch = X[idx]
+                if isinstance(X, PairFeatures):
+                    Xbatch = torch.from_numpy(X[batch]).to(y.device, dtype=torch.float32)
+                else:
+                    Xbatch = X[idx]
                 ybatch = y[idx]
 
                 if self.cudaEfficient:
-                    Xbatch = Xbatch.cuda()
-                    ybatch = ybatch.cuda()
+                    Xbatch = Xbatch.to(self.device)
+                    ybatch = ybatch.to(self.device)
                 output = self.model(Xbatch)
                 # loss
                 loss = self.loss_fn(output, ybatch)
@@ -108,51 +135,68 @@ class PyTorchClassifier(object):
                 self.optimizer.step()
         self.nepoch += epoch_size
 
-    def score(self, devX, devy):
+    def on_device(self, X):
+        return torch.is_tensor(X) and X.device == self.device and \
+            X.dtype == torch.float32
+
+    def to_device(self, X, dtype=torch.float32):
+        # tensor on the device; tensors are moved as they are, arrays go
+        # through numpy (sharing the memory of arrays of dtype on cpu)
+        if torch.is_tensor(X):
+            return X.to(self.device, dtype=dtype)
+        return torch.as_tensor(np.asarray(X), dtype=dtype).to(self.device)
+
+    def eval_batches(self, devX):
+        # (start, Xbatch) on the device, in order, in chunks of eval_batch_size
+        streamed = isinstance(devX, PairFeatures)
+        if not streamed and not self.on_device(devX):
+            devX = self.to_device(devX)
+        for i in range(0, len(devX), self.eval_batch_size):
+            Xbatch = devX[i:i + self.eval_batch_size]
+            if streamed:
+                Xbatch = self.to_device(Xbatch)
+            yield i, Xbatch
+
+    def logits(self, devX):
+        # outputs of the model for all rows of devX, written chunk by chunk
+        # into one preallocated tensor
         self.model.eval()
-        correct = 0
-        if not isinstance(devX, torch.cuda.FloatTensor) or self.cudaEfficient:
-            devX = torch.FloatTensor(devX).cuda()
-            devy = torch.LongTensor(devy).cuda()
+        logits = None
         with torch.no_grad():
-            for i in range(0, len(devX), self.batch_size):
-                Xbatch = devX[i:i + self.batch_size]
-                ybatch = devy[i:i + self.batch_size]
-                if self.cudaEfficient:
-                    Xbatch = Xbatch.cuda()
-                    ybatch = ybatch.cuda()
+            for i, Xbatch in self.eval_batches(devX):
                 output = self.model(Xbatch)
-                pred = output.data.max(1)[1]
-                correct += pred.long().eq(ybatch.data.long()).sum().item()
-            accuracy = 1.0 * correct / len(devX)
-        return accuracy
+                if logits is None:
+                    logits = output.new_empty(output.shape[:-2] +
+                                              (len(devX), output.shape[-1]))
+                logits[..., i:i + len(Xbatch), :] = output
+        return logits
+
+    def evaluate(self, devX, devy=None):
+        """
+        Labels, probabilities and (with devy) accuracy of devX, from a single
+        pass; for stacked models, one of each per member
+        """
+        logits = self.logits(devX)
+        labels = logits.argmax(-1)
+        probas = F.softmax(logits, dim=-1)
+        accuracy = None
+        if devy is not None:
+            devy = self.to_device(devy, dtype=torch.int64)
+            correct = labels.eq(devy).sum(-1)
+            accuracy = 1.0 * correct.item() / len(devX) if correct.dim() == 0 \
+                else [1.0 * c / len(devX) for c in correct.tolist()]
+        return labels, probas, accuracy
+
+    def score(self, devX, devy):
+        return self.evaluate(devX, devy)[2]
 
     def predict(self, devX):
-        self.model.eval()
-        if not isinstance(devX, torch.cuda.FloatTensor):
-            devX = torch.FloatTensor(devX).cuda()
-        yhat = np.array([])
-        with torch.no_grad():
-            for i in range(0, len(devX), self.batch_size):
-                Xbatch = devX[i:i + self.batch_size]
-                output = self.model(Xbatch)
-                yhat = np.append(yhat,
-                                 output.data.max(1)[1].cpu().numpy())
+        yhat = self.evaluate(devX)[0].cpu().numpy()
         yhat = np.vstack(yhat)
         return yhat
 
     def predict_proba(self, devX):
-        self.model.eval()
-        probas = []
-        with torch.no_grad():
-            for i in range(0, len(devX), self.batch_size):
-                Xbatch = devX[i:i + self.batch_size]
-                vals = F.softmax(self.model(Xbatch).data.cpu().numpy())
-                if not probas:
-                    probas = vals
-                else:
-                    probas = np.concatenate(probas, vals, axis=0)
-        return probas
+        return self.evaluate(devX)[1].cpu().numpy()
 
 
 """
@@ -162,8 +206,10 @@ MLP with Pytorch (nhid=0 --> Logistic Regression)
 class MLP(PyTorchClassifier):
     def __init__(self, params, inputdim, nclasses, l2reg=0., batch_size=64,
                  seed=1111, cudaEfficient=False):
-        super(self.__class__, self).__init__(inputdim, nclasses, l2reg,
-                                             batch_size, seed, cudaEfficient)
+        super(MLP, self).__init__(
+            inputdim, nclasses, l2reg, batch_size, seed, cudaEfficient,
+            device=None if "device" not in params else params["device"],
+            cpu_threads=None if "cpu_threads" not in params else params["cpu_threads"])
         """
         PARAMETERS:
         -nhid:       number of hidden units (0: Logistic Regression)
@@ -172,6 +218,11 @@ class MLP(PyTorchClassifier):
         -epoch_size: each epoch corresponds to epoch_size pass on the train set
         -max_epoch:  max number of epoches
         -dropout:    dropout for MLP
+        -device:     torch device ("cuda", "cpu"; default: cuda if available)
+        -cpu_threads: intra-op threads when training on cpu (default: torch's)
+        -stacked:    sweep l2reg with one StackedMLP instead of an MLP per value
+        -solver:     "lbfgs" or "ridge" to train nhid=0 with LBFGSLogReg or
+                     RidgeClassifier instead (see SOLVERS)
         """
 
         self.nhid = 0 if "nhid" not in params else params["nhid"]
@@ -185,18 +236,328 @@ class MLP(PyTorchClassifier):
         if params["nhid"] == 0:
             self.model = nn.Sequential(
                 nn.Linear(self.inputdim, self.nclasses),
-            ).cuda()
+            ).to(self.device)
         else:
             self.model = nn.Sequential(
                 nn.Linear(self.inputdim, params["nhid"]),
                 nn.Dropout(p=self.dropout),
                 nn.Sigmoid(),
                 nn.Linear(params["nhid"], self.nclasses),
-            ).cuda()
+            ).to(self.device)
 
-        self.loss_fn = nn.CrossEntropyLoss().cuda()
+        self.loss_fn = nn.CrossEntropyLoss().to(self.device)
         self.loss_fn.size_average = False
 
         optim_fn, optim_params = utils.get_optimizer(self.optim)
         self.optimizer = optim_fn(self.model.parameters(), **optim_params)
         self.optimizer.param_groups[0]['weight_decay'] = self.l2reg
+
+
+class StackedLinear(nn.Module):
+    """
+    nmembers copies of a linear layer applied to a stacked batch:
+    (nmembers, n, inputdim) -> (nmembers, n, outputdim). A (n, inputdim)
+    input is shared by all members.
+    """
+    def __init__(self, linear, nmembers):
+        super(StackedLinear, self).__init__()
+        self.nmembers = nmembers
+        self.weight = nn.Parameter(
+            linear.weight.detach().t().unsqueeze(0).repeat(nmembers, 1, 1))
+        self.bias = nn.Parameter(
+            linear.bias.detach().view(1, 1, -1).repeat(nmembers, 1, 1))
+
+    def forward(self, x):
+        if x.dim() == 2:
+            x = x.unsqueeze(0).expand(self.nmembers, -1, -1)
+        return torch.baddbmm(self.bias, x, self.weight)
+
+
+class StackedMLP(MLP):
+    """
+    MLPs of several l2reg values trained as one model: the weights of the
+    members are stacked, each minibatch drives all of them, and early
+    stopping is tracked per member. fit() and score() return one dev
+    accuracy per l2reg.
+    """
+    def __init__(self, params, inputdim, nclasses, l2regs, batch_size=64,
+                 seed=1111, cudaEfficient=False):
+        # members start from the weights of the MLP with the same seed, like
+        # separate runs do
+        super(StackedMLP, self).__init__(params, inputdim, nclasses, 0.,
+                                         batch_size, seed, cudaEfficient)
+        self.l2regs = l2regs
+        self.model = nn.Sequential(*[
+            StackedLinear(layer, len(l2regs)) if isinstance(layer, nn.Linear) else layer
+            for layer in self.model]).to(self.device)
+
+        # weight decay of each member, added to the gradient as the
+        # optimizers do with their weight_decay
+        decay = torch.tensor(l2regs, dtype=torch.float32,
+                             device=self.device).view(-1, 1, 1)
+        for param in self.model.parameters():
+            param.register_hook(lambda grad, param=param: grad + decay * param.detach())
+        self.loss_fn = self.stacked_loss
+
+        optim_fn, optim_params = utils.get_optimizer(self.optim)
+        self.optimizer = optim_fn(self.model.parameters(), **optim_params)
+
+    def stacked_loss(self, output, y):
+        # sum over the members of their mean cross-entropy
+        nmembers, n = output.shape[:2]
+        return F.cross_entropy(output.reshape(nmembers * n, -1),
+                               y.repeat(nmembers), reduction='sum') / n
+
+    @with_threads
+    def fit(self, X, y, validation_data=None, validation_split=None,
+            early_stop=True):
+        self.nepoch = 0
+        nmembers = len(self.l2regs)
+        bestaccuracy = [-1] * nmembers
+        stop_train = [False] * nmembers
+        early_stop_count = [0] * nmembers
+
+        # Preparing validation data
+        trainX, trainy, devX, devy = self.prepare_split(X, y, validation_data,
+                                                        validation_split)
+
+        # Training: stopped members keep training, but are no longer tracked
+        bestmodel = utils.ModelSnapshot(self.model)
+        while not all(stop_train) and self.nepoch <= self.max_epoch:
+            self.trainepoch(trainX, trainy, epoch_size=self.epoch_size)
+            for k, accuracy in enumerate(self.score(devX, devy)):
+                if stop_train[k]:
+                    continue
+                if accuracy > bestaccuracy[k]:
+                    bestaccuracy[k] = accuracy
+                    bestmodel.save(k)
+                elif early_stop:
+                    if early_stop_count[k] >= self.tenacity:
+                        stop_train[k] = True
+                    early_stop_count[k] += 1
+        bestmodel.restore()
+        return bestaccuracy
+
+"""
+Logistic Regression with full-batch L-BFGS (nhid=0)
+"""
+
+class LBFGSLogReg(PyTorchClassifier):
+    """
+    Multinomial logistic regression minimizing the mean cross-entropy plus
+    l2reg/2 * |W|^2, solved with full-batch L-BFGS instead of minibatch
+    epochs and early stopping
+    """
+    def __init__(self, params, inputdim, nclasses, l2reg=0., batch_size=64,
+                 seed=1111, cudaEfficient=False):
+        super(LBFGSLogReg, self).__init__(
+            inputdim, nclasses, l2reg, batch_size, seed, cudaEfficient,
+            device=None if "device" not in params else params["device"],
+            cpu_threads=None if "cpu_threads" not in params else params["cpu_threads"])
+        assert params["nhid"] == 0, 'The lbfgs solver only trains nhid=0'
+        self.max_iter = 500 if "max_iter" not in params else params["max_iter"]
+        self.batch_size = 64 if "batch_size" not in params else params["batch_size"]
+
+        self.model = nn.Linear(self.inputdim, self.nclasses).to(self.device)
+        with torch.no_grad():
+            self.model.weight.zero_()
+            self.model.bias.zero_()
+
+    def prepare_full_batch(self, X, y, validation_data, validation_split):
+        trainX, trainy, devX, devy = self.prepare_split(X, y, validation_data,
+                                                        validation_split)
+        # PairFeatures stay lazy: solve() builds them chunk by chunk
+        if not isinstance(trainX, PairFeatures):
+            trainX = trainX.to(self.device)
+        return trainX, trainy.to(self.device), devX, devy
+
+    def solve(self, X, y, l2reg):
+        # continues from the current weights
+        self.model.train()
+        optimizer = optim.LBFGS(self.model.parameters(), lr=1,
+                                max_iter=self.max_iter,
+                                line_search_fn='strong_wolfe')
+
+        def closure():
+            # loss and gradient accumulated over chunks of rows, so that the
+            # feature matrix of PairFeatures is never held at once
+            optimizer.zero_grad()
+            chunks = self.eval_batches(X) if isinstance(X, PairFeatures) else [(0, X)]
+            loss = 0.5 * l2reg * self.model.weight.pow(2).sum()
+            loss.backward()
+            loss = loss.detach()
+            for i, Xbatch in chunks:
+                chunk_loss = F.cross_entropy(self.model(Xbatch), y[i:i + len(Xbatch)],
+                                             reduction='sum') / len(X)
+                chunk_loss.backward()
+                loss += chunk_loss.detach()
+            return loss
+        optimizer.step(closure)
+
+    @with_threads
+    def fit(self, X, y, validation_data=None, validation_split=None,
+            early_stop=True):
+        trainX, trainy, devX, devy = self.prepare_full_batch(
+            X, y, validation_data, validation_split)
+        self.solve(trainX, trainy, self.l2reg)
+        return self.score(devX, devy)
+
+
+class LBFGSLogRegPath(LBFGSLogReg):
+    """
+    LBFGSLogReg solved for each of several l2reg values, from the largest
+    down, each warm-started from the previous solution. fit() and score()
+    return one dev accuracy per l2reg.
+    """
+    def __init__(self, params, inputdim, nclasses, l2regs, batch_size=64,
+                 seed=1111, cudaEfficient=False):
+        super(LBFGSLogRegPath, self).__init__(params, inputdim, nclasses, 0.,
+                                              batch_size, seed, cudaEfficient)
+        self.l2regs = l2regs
+        self.solutions = None
+
+    @with_threads
+    def fit(self, X, y, validation_data=None, validation_split=None,
+            early_stop=True):
+        trainX, trainy, devX, devy = self.prepare_full_batch(
+            X, y, validation_data, validation_split)
+        self.solutions = [None] * len(self.l2regs)
+        for k in sorted(range(len(self.l2regs)), key=lambda k: -self.l2regs[k]):
+            self.solve(trainX, trainy, self.l2regs[k])
+            self.solutions[k] = utils.ModelSnapshot(self.model)
+        return self.score(devX, devy)
+
+    def score(self, devX, devy):
+        scores = []
+        for solution in self.solutions:
+            solution.restore()
+            scores.append(super(LBFGSLogRegPath, self).score(devX, devy))
+        return scores
+
+
+"""
+Ridge classifier in closed form (nhid=0)
+"""
+
+class RidgeClassifier(PyTorchClassifier):
+    """
+    One-vs-rest ridge regression on the one-hot labels, minimizing the mean
+    squared error plus l2reg * |W|^2 (the bias is not penalized), solved
+    exactly from one eigendecomposition of the centered Gram matrix, in
+    float64. Once decomposed, each l2reg only costs a matrix product.
+    """
+    def __init__(self, params, inputdim, nclasses, l2reg=0., batch_size=64,
+                 seed=1111, cudaEfficient=False):
+        super(RidgeClassifier, self).__init__(
+            inputdim, nclasses, l2reg, batch_size, seed, cudaEfficient,
+            device=None if "device" not in params else params["device"],
+            cpu_threads=None if "cpu_threads" not in params else params["cpu_threads"])
+        assert params["nhid"] == 0, 'The ridge solver only trains nhid=0'
+
+        self.model = nn.Linear(self.inputdim, self.nclasses).to(self.device)
+
+    def decompose(self, X, y):
+        """
+        Eigenvalues lambda, A, B and the means of X and Y, such that the
+        weights of l2reg are A (B / (lambda + l2reg)). The d x d covariance
+        is decomposed when n >= d, the n x n kernel otherwise.
+        """
+        n = len(X)
+        Y = F.one_hot(y.to(self.device), self.nclasses).double()
+        ymean = Y.mean(0)
+        Yc = Y - ymean
+        if n >= self.inputdim:
+            gram = torch.zeros(self.inputdim, self.inputdim, dtype=torch.float64,
+                               device=self.device)
+            XtY = torch.zeros(self.inputdim, self.nclasses, dtype=torch.float64,
+                              device=self.device)
+            xsum = torch.zeros(self.inputdim, dtype=torch.float64, device=self.device)
+            for i, Xbatch in self.eval_batches(X):
+                Xbatch = Xbatch.double()
+                gram.addmm_(Xbatch.t(), Xbatch)
+                XtY.addmm_(Xbatch.t(), Yc[i:i + len(Xbatch)])
+                xsum += Xbatch.sum(0)
+            xmean = xsum / n
+            gram = gram / n - torch.outer(xmean, xmean)
+            eigvals, A = torch.linalg.eigh(gram)
+            B = A.t().mm(XtY / n)
+        else:
+            Xc = torch.cat([Xbatch.double() for _, Xbatch in self.eval_batches(X)])
+            xmean = Xc.mean(0)
+            Xc -= xmean
+            eigvals, U = torch.linalg.eigh(Xc.mm(Xc.t()) / n)
+            A = Xc.t().mm(U) / n
+            B = U.t().mm(Yc)
+        return eigvals.clamp(min=0), A, B, xmean, ymean
+
+    def solve(self, decomposition, l2reg):
+        eigvals, A, B, xmean, ymean = decomposition
+        W = A.mm(B / (eigvals + l2reg).unsqueeze(1))
+        with torch.no_grad():
+            self.model.weight.copy_(W.t())
+            self.model.bias.copy_(ymean - xmean.matmul(W))
+
+    @with_threads
+    def fit(self, X, y, validation_data=None, validation_split=None,
+            early_stop=True):
+        trainX, trainy, devX, devy = self.prepare_split(X, y, validation_data,
+                                                        validation_split)
+        self.solve(self.decompose(trainX, trainy), self.l2reg)
+        return self.score(devX, devy)
+
+
+class RidgeClassifierPath(RidgeClassifier):
+    """
+    RidgeClassifier solved for each of several l2reg values from the same
+    decomposition. fit() and score() return one dev accuracy per l2reg.
+    """
+    def __init__(self, params, inputdim, nclasses, l2regs, batch_size=64,
+                 seed=1111, cudaEfficient=False):
+        super(RidgeClassifierPath, self).__init__(params, inputdim, nclasses, 0.,
+                                                  batch_size, seed, cudaEfficient)
+        self.l2regs = l2regs
+        self.solutions = None
+
+    @with_threads
+    def fit(self, X, y, validation_data=None, validation_split=None,
+            early_stop=True):
+        trainX, trainy, devX, devy = self.prepare_split(X, y, validation_data,
+                                                        validation_split)
+        decomposition = self.decompose(trainX, trainy)
+        self.solutions = []
+        for l2reg in self.l2regs:
+            self.solve(decomposition, l2reg)
+            self.solutions.append(utils.ModelSnapshot(self.model))
+        return self.score(devX, devy)
+
+    def score(self, devX, devy):
+        scores = []
+        for solution in self.solutions:
+            solution.restore()
+            scores.append(super(RidgeClassifierPath, self).score(devX, devy))
+        return scores
+
+
+SOLVERS = {
+    # solver: (classifier of one l2reg, classifier of a list of l2reg)
+    'lbfgs': (LBFGSLogReg, LBFGSLogRegPath),
+    'ridge': (RidgeClassifier, RidgeClassifierPath),
+}
+
+
+def get_classifier(params, inputdim, nclasses, l2reg, seed=1111,
+                   cudaEfficient=False):
+    """
+    Classifier of the classifier config params. With a list of l2reg
+    values, one classifier trains the whole sweep (StackedMLP, or the path
+    classifier of the solver, see SOLVERS), and its fit() and score() return
+    one dev accuracy per value.
+    """
+    single, path = MLP, StackedMLP
+    if "solver" in params and params["solver"] is not None:
+        single, path = SOLVERS[params["solver"]]
+    if isinstance(l2reg, list):
+        return path(params, inputdim=inputdim, nclasses=nclasses, l2regs=l2reg,
+                    seed=seed, cudaEfficient=cudaEfficient)
+    return single(params, inputdim=inputdim, nclasses=nclasses, l2reg=l2reg,
+                  seed=seed, cudaEfficient=cudaEfficient)
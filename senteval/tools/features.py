@@ -0,0 +1,73 @@
+# Copyright (c) 2017-present, Facebook, Inc.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+#
+
+"""
+Features of sentence pairs built on demand from the sentence embeddings
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import numpy as np
+
+BLOCKS = {
+    'u': lambda u, v: u,
+    'v': lambda u, v: v,
+    'u*v': lambda u, v: u * v,
+    '|u-v|': lambda u, v: np.abs(u - v),
+}
+
+
+class PairFeatures(object):
+    """
+    Rows made of the blocks (e.g. u, v, u*v, |u-v|) of the embeddings u and
+    v of paired sentences. Only u and v are stored (possibly memory-mapped,
+    see encoding.allocate); indexing with a slice or an index array builds
+    the requested rows, so classifiers can stream minibatches instead of
+    holding the feature matrix.
+    """
+    def __init__(self, enc1, enc2, blocks=('u', 'v', 'u*v', '|u-v|')):
+        assert enc1.shape == enc2.shape
+        self.enc1 = enc1
+        self.enc2 = enc2
+        self.blocks = blocks
+        self.shape = (enc1.shape[0], len(blocks) * enc1.shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        u, v = np.asarray(self.enc1[idx]), np.asarray(self.enc2[idx])
+        return np.hstack([BLOCKS[block](u, v) for block in self.blocks])
+
+    def subset(self, idx):
+        # features of the pairs idx, still built on demand
+        return PairFeatures(self.enc1[idx], self.enc2[idx], self.blocks)
+
+    def __array__(self, dtype=None, copy=None):
+        # whole feature matrix, e.g. for scikit-learn
+        features = self[:]
+        return features if dtype is None else features.astype(dtype)
+
+
+def take(X, idx):
+    """ Rows idx of a feature matrix; PairFeatures stay lazy """
+    if isinstance(X, PairFeatures):
+        return X.subset(idx)
+    return X[idx]
+
+
+def digest(h, X, chunk=65536):
+    """ Feeds the content of a feature matrix (or labels) to the hash h """
+    if isinstance(X, PairFeatures):
+        h.update(repr(X.blocks).encode('utf-8'))
+        arrays = [X.enc1, X.enc2]
+    else:
+        arrays = [X]
+    for a in arrays:
+        a = a if hasattr(a, 'dtype') else np.asarray(a)
+        h.update(('%s%s' % (a.dtype, a.shape)).encode('utf-8'))
+        for i in range(0, len(a), chunk):
+            h.update(np.ascontiguousarray(a[i:i + chunk]).data)
@@ -11,7 +11,6 @@ Image Annotation/Search for COCO with Pytorch
 from __future__ import absolute_import, division, unicode_literals
 
 import logging
-import copy
 import numpy as np
 
 import torch
@@ -19,6 +18,8 @@ from torch import nn
 from torch.autograd import Variable
 import torch.optim as optim
 
+from senteval import utils
+
 
 class COCOProjNet(nn.Module):
     def __init__(self, config):
@@ -100,6 +101,7 @@ class ImageSentenceRankingPytorch(object):
         np.random.seed(self.seed)
         torch.manual_seed(self.seed)
         torch.cuda.manual_seed(self.seed)
+        self.device = utils.get_device(None if 'device' not in config else config['device'])
 
         self.train = train
         self.valid = valid
@@ -117,22 +119,28 @@ class ImageSentenceRankingPytorch(object):
 
         config_model = {'imgdim': self.imgdim,'sentdim': self.sentdim,
                         'projdim': self.projdim}
-        self.model = COCOProjNet(config_model).cuda()
+        self.model = COCOProjNet(config_model).to(self.device)
 
-        self.loss_fn = PairwiseRankingLoss(margin=self.margin).cuda()
+        self.loss_fn = PairwiseRankingLoss(margin=self.margin).to(self.device)
 
         self.optimizer = optim.Adam(self.model.parameters())
 
-    def prepare_data(self, trainTxt, trainImg, devTxt, devImg,
-                     testTxt, testImg):
-        trainTxt = torch.FloatTensor(trainTxt)
-        trainImg = torch.FloatTensor(trainImg)
-        devTxt = torch.FloatTensor(devTxt).cuda()
-        devImg = torch.FloatTensor(devImg).cuda()
-        testTxt = torch.FloatTensor(testTxt).cuda()
-        testImg = torch.FloatTensor(testImg).cuda()
+    def prepare_data(self, train, valid, test):
+        # features are stored once per image, and each caption points to its
+        # image: training images are gathered batch by batch (see
+        # train_images), dev/test captions come in groups of 5 per image
+        trainTxt = torch.FloatTensor(train['sentfeat'])
+        devTxt = torch.FloatTensor(valid['sentfeat']).to(self.device)
+        devImg = torch.FloatTensor(valid['imgfeat'][valid['imgidx'][0::5]]).to(self.device)
+        testTxt = torch.FloatTensor(test['sentfeat']).to(self.device)
+        testImg = torch.FloatTensor(test['imgfeat'][test['imgidx'][0::5]]).to(self.device)
+
+        return trainTxt, devTxt, devImg, testTxt, testImg
 
-        return trainTxt, trainImg, devTxt, devImg, testTxt, testImg
+    def train_images(self, idx):
+        # features of the images of the training captions idx
+        rows = self.train['imgidx'][idx.numpy()]
+        return torch.from_numpy(np.asarray(self.train['imgfeat'][rows]))
 
     def run(self):
         self.nepoch = 0
@@ -142,15 +150,14 @@ class ImageSentenceRankingPytorch(object):
 
         # Preparing data
         logging.info('prepare data')
-        trainTxt, trainImg, devTxt, devImg, testTxt, testImg = \
-            self.prepare_data(self.train['sentfeat'], self.train['imgfeat'],
-                              self.valid['sentfeat'], self.valid['imgfeat'],
-                              self.test['sentfeat'], self.test['imgfeat'])
+        trainTxt, devTxt, devImg, testTxt, testImg = \
+            self.prepare_data(self.train, self.valid, self.test)
 
         # Training
+        bestmodel = utils.ModelSnapshot(self.model)
         while not stop_train and self.nepoch <= self.maxepoch:
             logging.info('start epoch')
-            self.trainepoch(trainTxt, trainImg, devTxt, devImg, nepoches=1)
+            self.trainepoch(trainTxt, devTxt, devImg, nepoches=1)
             logging.info('Epoch {0} finished'.format(self.nepoch))
 
             results = {'i2t': {'r1': 0, 'r5': 0, 'r10': 0, 'medr': 0},
@@ -159,7 +166,7 @@ class ImageSentenceRankingPytorch(object):
             score = 0
             for i in range(5):
                 devTxt_i = devTxt[i*5000:(i+1)*5000]
-                devImg_i = devImg[i*5000:(i+1)*5000]
+                devImg_i = devImg[i*1000:(i+1)*1000]
                 # Compute dev ranks img2txt
                 r1_i2t, r5_i2t, r10_i2t, medr_i2t = self.i2t(devImg_i,
                                                              devTxt_i)
@@ -191,12 +198,12 @@ class ImageSentenceRankingPytorch(object):
             # early stop on Pearson
             if score > bestdevscore:
                 bestdevscore = score
-                bestmodel = copy.deepcopy(self.model)
+                bestmodel.save()
             elif self.early_stop:
                 if early_stop_count >= 3:
                     stop_train = True
                 early_stop_count += 1
-        self.model = bestmodel
+        bestmodel.restore()
 
         # Compute test for the 5 splits
         results = {'i2t': {'r1': 0, 'r5': 0, 'r10': 0, 'medr': 0},
@@ -204,7 +211,7 @@ class ImageSentenceRankingPytorch(object):
                    'dev': bestdevscore}
         for i in range(5):
             testTxt_i = testTxt[i*5000:(i+1)*5000]
-            testImg_i = testImg[i*5000:(i+1)*5000]
+            testImg_i = testImg[i*1000:(i+1)*1000]
             # Compute test ranks img2txt
             r1_i2t, r5_i2t, r10_i2t, medr_i2t = self.i2t(testImg_i, testTxt_i)
             results['i2t']['r1'] += r1_i2t / 5
@@ -223,7 +230,7 @@ class ImageSentenceRankingPytorch(object):
                              results['t2i']['r1'], results['t2i']['r5'], \
                              results['t2i']['r10'], results['t2i']['medr']
 
-    def trainepoch(self, trainTxt, trainImg, devTxt, devImg, nepoches=1):
+    def trainepoch(self, trainTxt, devTxt, devImg, nepoches=1):
         self.model.train()
         for _ in range(self.nepoch, self.nepoch + nepoches):
             permutation = list(np.random.permutation(len(trainTxt)))
@@ -242,8 +249,8 @@ class ImageSentenceRankingPytorch(object):
                     logging.info("Text to Image: {0}, {1}, {2}, {3}".format(
                         r1_t2i, r5_t2i, r10_t2i, medr_t2i))
                 idx = torch.LongTensor(permutation[i:i + self.batch_size])
-                imgbatch = Variable(trainImg.index_select(0, idx)).cuda()
-                sentbatch = Variable(trainTxt.index_select(0, idx)).cuda()
+                imgbatch = Variable(self.train_images(idx)).to(self.device)
+                sentbatch = Variable(trainTxt.index_select(0, idx)).to(self.device)
 
                 idximgc = np.random.choice(permutation[:i] +
                                            permutation[i + self.batch_size:],
@@ -254,10 +261,10 @@ class ImageSentenceRankingPytorch(object):
                 idximgc = torch.LongTensor(idximgc)
                 idxsentc = torch.LongTensor(idxsentc)
                 # Get indexes for contrastive images and sentences
-                imgcbatch = Variable(trainImg.index_select(0, idximgc)).view(
-                    -1, self.ncontrast, self.imgdim).cuda()
+                imgcbatch = Variable(self.train_images(idximgc)).view(
+                    -1, self.ncontrast, self.imgdim).to(self.device)
                 sentcbatch = Variable(trainTxt.index_select(0, idxsentc)).view(
-                    -1, self.ncontrast, self.sentdim).cuda()
+                    -1, self.ncontrast, self.sentdim).to(self.device)
 
                 anchor1, anchor2, img_sentc, sent_imgc = self.model(
                     imgbatch, sentbatch, imgcbatch, sentcbatch)
@@ -273,7 +280,7 @@ class ImageSentenceRankingPytorch(object):
 
     def t2i(self, images, captions):
         """
-        Images: (5N, imgdim) matrix of images
+        Images: (N, imgdim) matrix of images
         Captions: (5N, sentdim) matrix of captions
         """
         with torch.no_grad():
@@ -282,14 +289,14 @@ class ImageSentenceRankingPytorch(object):
             for i in range(0, len(images), self.batch_size):
                 img_embed.append(self.model.proj_image(
                     Variable(images[i:i + self.batch_size])))
+            for i in range(0, len(captions), self.batch_size):
                 sent_embed.append(self.model.proj_sentence(
                     Variable(captions[i:i + self.batch_size])))
             img_embed = torch.cat(img_embed, 0).data
             sent_embed = torch.cat(sent_embed, 0).data
 
-            npts = int(img_embed.size(0) / 5)
-            idxs = torch.cuda.LongTensor(range(0, len(img_embed), 5))
-            ims = img_embed.index_select(0, idxs)
+            npts = img_embed.size(0)
+            ims = img_embed
 
             ranks = np.zeros(5 * npts)
             for index in range(npts):
@@ -313,7 +320,7 @@ class ImageSentenceRankingPytorch(object):
 
     def i2t(self, images, captions):
         """
-        Images: (5N, imgdim) matrix of images
+        Images: (N, imgdim) matrix of images
         Captions: (5N, sentdim) matrix of captions
         """
         with torch.no_grad():
@@ -322,19 +329,20 @@ class ImageSentenceRankingPytorch(object):
             for i in range(0, len(images), self.batch_size):
                 img_embed.append(self.model.proj_image(
                     Variable(images[i:i + self.batch_size])))
+            for i in range(0, len(captions), self.batch_size):
                 sent_embed.append(self.model.proj_sentence(
                     Variable(captions[i:i + self.batch_size])))
             img_embed = torch.cat(img_embed, 0).data
             sent_embed = torch.cat(sent_embed, 0).data
 
-            npts = int(img_embed.size(0) / 5)
+            npts = img_embed.size(0)
             index_list = []
 
             ranks = np.zeros(npts)
             for index in range(npts):
 
                 # Get query image
-                query_img = img_embed[5 * index]
+                query_img = img_embed[index]
 
                 # Compute scores
                 scores = torch.mm(query_img.view(1, -1),
@@ -10,7 +10,6 @@ Semantic Relatedness (supervised) with Pytorch
 """
 from __future__ import absolute_import, division, unicode_literals
 
-import copy
 import numpy as np
 
 import torch
@@ -19,6 +18,9 @@ import torch.optim as optim
 
 from scipy.stats import pearsonr
 
+from senteval import utils
+from senteval.tools.features import PairFeatures
+
 
 class RelatednessPytorch(object):
     # Can be used for SICK-Relatedness, and STS14
@@ -26,8 +28,8 @@ class RelatednessPytorch(object):
         # fix seed
         np.random.seed(config['seed'])
         torch.manual_seed(config['seed'])
-        assert torch.cuda.is_available(), 'torch.cuda required for Relatedness'
         torch.cuda.manual_seed(config['seed'])
+        self.device = utils.get_device(None if 'device' not in config else config['device'])
 
         self.train = train
         self.valid = valid
@@ -48,9 +50,8 @@ class RelatednessPytorch(object):
         )
         self.loss_fn = nn.MSELoss()
 
-        if torch.cuda.is_available():
-            self.model = self.model.cuda()
-            self.loss_fn = self.loss_fn.cuda()
+        self.model = self.model.to(self.device)
+        self.loss_fn = self.loss_fn.to(self.device)
 
         self.loss_fn.size_average = False
         self.optimizer = optim.Adam(self.model.parameters(),
@@ -58,12 +59,16 @@ class RelatednessPytorch(object):
 
     def prepare_data(self, trainX, trainy, devX, devy, testX, testy):
         # Transform probs to log-probs for KL-divergence
-        trainX = torch.from_numpy(trainX).float().cuda()
-        trainy = torch.from_numpy(trainy).float().cuda()
-        devX = torch.from_numpy(devX).float().cuda()
-        devy = torch.from_numpy(devy).float().cuda()
-        testX = torch.from_numpy(testX).float().cuda()
-        testY = torch.from_numpy(testy).float().cuda()
+        # PairFeatures are kept as is, and built minibatch by minibatch
+        if not isinstance(trainX, PairFeatures):
+            trainX = torch.from_numpy(trainX).float().to(self.device)
+        trainy = torch.from_numpy(trainy).float().to(self.device)
+        if not isinstance(devX, PairFeatures):
+            devX = torch.from_numpy(devX).float().to(self.device)
+        devy = torch.from_numpy(devy).float().to(self.device)
+        if not isinstance(testX, PairFeatures):
+            testX = torch.from_numpy(testX).float().to(self.device)
+        testY = torch.from_numpy(testy).float().to(self.device)
 
         return trainX, trainy, devX, devy, testX, testy
 
@@ -81,6 +86,7 @@ class RelatednessPytorch(object):
             self.test['X'], self.test['y'])
 
         # Training
+        bestmodel = utils.ModelSnapshot(self.model)
         while not stop_train and self.nepoch <= self.maxepoch:
             self.trainepoch(trainX, trainy, nepoches=50)
             yhat = np.dot(self.predict_proba(devX), r)
@@ -89,12 +95,12 @@ class RelatednessPytorch(object):
             # early stop on Pearson
             if pr > bestpr:
                 bestpr = pr
-                bestmodel = copy.deepcopy(self.model)
+                bestmodel.save()
             elif self.early_stop:
                 if early_stop_count >= 3:
                     stop_train = True
                 early_stop_count += 1
-        self.model = bestmodel
+        bestmodel.restore()
 
         yhat = np.dot(self.predict_proba(testX), r)
 
@@ -107,8 +113,12 @@ class RelatednessPytorch(object):
             all_costs = []
             for i in range(0, len(X), self.batch_size):
                 # forward
-                idx = torch.from_numpy(permutation[i:i + self.batch_size]).long().cuda()
-                Xbatch = X[idx]
+                batch = permutation[i:i + self.batch_size]
+                idx = torch.from_numpy(batch).long().to(self.device)
+                if isinstance(X, PairFeatures):
+                    Xbatch = torch.from_numpy(X[batch]).float().to(self.device)
+                else:
+                    Xbatch = X[idx]
                 ybatch = y[idx]
                 output = self.model(Xbatch)
                 # loss
@@ -127,6 +137,8 @@ class RelatednessPytorch(object):
         with torch.no_grad():
             for i in range(0, len(devX), self.batch_size):
                 Xbatch = devX[i:i + self.batch_size]
+                if isinstance(devX, PairFeatures):
+                    Xbatch = torch.from_numpy(Xbatch).float().to(self.device)
                 if len(probas) == 0:
                     probas = self.model(Xbatch).data.cpu().numpy()
                 else:
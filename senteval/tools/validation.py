@@ -14,9 +14,22 @@ Validation and classification
 """
 from __future__ import absolute_import, division, unicode_literals
 
+import os
+import io
+import json
+import pickle
+import shutil
+import hashlib
 import logging
+import itertools
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from senteval.tools.classifier import MLP
+from senteval import timing, utils
+from senteval.cache import atomic_write
+from senteval.tools.classifier import MLP, get_classifier
+from senteval.tools.features import PairFeatures, digest, take
 
 import sklearn
 assert(sklearn.__version__ >= "0.18.0"), \
@@ -32,9 +45,295 @@ def get_classif_name(classifier_config, usepytorch):
         nhid = classifier_config['nhid']
         optim = 'adam' if 'optim' not in classifier_config else classifier_config['optim']
         bs = 64 if 'batch_size' not in classifier_config else classifier_config['batch_size']
-        modelname = 'pytorch-MLP-nhid%s-%s-bs%s' % (nhid, optim, bs)
+        device = utils.get_device(None if 'device' not in classifier_config
+                                  else classifier_config['device'])
+        solver = None if 'solver' not in classifier_config else classifier_config['solver']
+        if solver == 'lbfgs':
+            modelname = 'pytorch-LogReg-lbfgs-%s' % device.type
+        elif solver == 'ridge':
+            modelname = 'pytorch-Ridge-%s' % device.type
+        else:
+            modelname = 'pytorch-MLP-nhid%s-%s-bs%s-%s' % (nhid, optim, bs, device.type)
     return modelname
 
+def is_sweep(classifier_config, usepytorch):
+    # whether one classifier trains all the regs of the search at once
+    if not usepytorch:
+        return False
+    stacked = 'stacked' in classifier_config and classifier_config['stacked']
+    solver = 'solver' in classifier_config and classifier_config['solver']
+    return bool(stacked or solver)
+
+
+class ScoreCache(object):
+    """
+    Dev scores of a reg search by (fold, reg), kept in path if set (see
+    score_cache), so that extending or refining the grid only trains the
+    new points, and rerunning the same search trains none
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.scores = {}
+        if path is not None and os.path.exists(path):
+            with io.open(path, 'rb') as f:
+                self.scores = pickle.load(f)
+
+    def missing(self, fold, regs):
+        return [reg for reg in regs if (fold, reg) not in self.scores]
+
+    def get(self, fold, reg):
+        return self.scores[(fold, reg)]
+
+    def add(self, fold, reg, score):
+        self.scores[(fold, reg)] = score
+
+    def save(self):
+        if self.path is None:
+            return
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        atomic_write(self.path, pickle.dumps(self.scores,
+                                             protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def score_cache(search, context, data):
+    """
+    ScoreCache of a search in classifier['score_cache_dir'] (in memory if
+    unset), keyed by the search, the seed and classifier settings of the
+    context and the content of data (features and labels)
+    """
+    classifier_config = context['classifier']
+    cache_dir = None if 'score_cache_dir' not in classifier_config else \
+        classifier_config['score_cache_dir']
+    if cache_dir is None:
+        return ScoreCache()
+    # settings that do not change the scores
+    ignored = ['n_jobs', 'cpu_threads', 'regs', 'score_cache_dir']
+    settings = {'search': search, 'usepytorch': context['usepytorch'],
+                'seed': context['seed'], 'nclasses': context['nclasses'],
+                'classifier': {key: value for key, value in classifier_config.items()
+                               if key not in ignored}}
+    h = hashlib.sha1(json.dumps(settings, sort_keys=True, default=str)
+                     .encode('utf-8'))
+    for X in data:
+        digest(h, X)
+    return ScoreCache(os.path.join(cache_dir, h.hexdigest() + '.pkl'))
+
+
+def is_halving(classifier_config, usepytorch):
+    # whether classifier['search'] is searched by successive halving
+    return usepytorch and 'search' in classifier_config and \
+        bool(classifier_config['search'])
+
+
+def halving_search(context, regs, splits, cudaEfficient=False):
+    """
+    (classifier config, reg, dev score) of the best MLP of the grid
+    classifier['search'] (e.g. {'nhid': [50, 100], 'dropout': [0, .1]})
+    times regs, by successive halving. In each round, the candidates train
+    epoch_size epochs on every (X_train, y_train, X_dev, y_dev) split and
+    are scored by their best mean dev accuracy so far. After each rung, the
+    best 1/eta of them (halving_eta, default 3) go on for eta times as many
+    rounds. This stops once one is left or max_epoch is reached.
+    """
+    classifier_config = context['classifier']
+    grid = classifier_config['search']
+    eta = 3 if 'halving_eta' not in classifier_config else \
+        classifier_config['halving_eta']
+    epoch_size = 4 if 'epoch_size' not in classifier_config else \
+        classifier_config['epoch_size']
+    max_epoch = 200 if 'max_epoch' not in classifier_config else \
+        classifier_config['max_epoch']
+    maxrounds = max(1, max_epoch // epoch_size)
+
+    candidates = []
+    keys = sorted(grid)
+    for values in itertools.product(*[grid[key] for key in keys]):
+        config = dict(classifier_config)
+        config.update(zip(keys, values))
+        # the candidates are plain MLPs
+        for key in ['search', 'stacked', 'solver']:
+            config.pop(key, None)
+        candidates.extend((config, reg) for reg in regs)
+
+    def build(c):
+        # one MLP per split, trained a round at a time
+        config, reg = candidates[c]
+        mlps = [MLP(config, inputdim=X_train.shape[1],
+                    nclasses=context['nclasses'], l2reg=reg,
+                    seed=context['seed'], cudaEfficient=cudaEfficient)
+                for X_train, _, _, _ in splits]
+        for clf in mlps:
+            clf.nepoch = 0
+        return mlps
+
+    # the models of a candidate are built when it first trains and freed
+    # once it is dropped
+    models = [None] * len(candidates)
+    models[0] = build(0)
+    data = [models[0][i].prepare_split(X_train, y_train,
+                                       validation_data=(X_dev, y_dev))
+            for i, (X_train, y_train, X_dev, y_dev) in enumerate(splits)]
+    cpu_threads = models[0][0].cpu_threads
+
+    rounds = [0] * len(candidates)
+    best = [-1] * len(candidates)
+    alive = list(range(len(candidates)))
+    budget = 1
+    # trainepoch is called directly, so the threads of fit() are set here
+    with utils.torch_threads(cpu_threads):
+        while True:
+            for c in alive:
+                if models[c] is None:
+                    # the MLPs seed the generators when built: keep the
+                    # state the training draws from
+                    with utils.preserved_rng():
+                        models[c] = build(c)
+                for _ in range(rounds[c], budget):
+                    accuracies = []
+                    for clf, (trainX, trainy, devX, devy) in zip(models[c], data):
+                        clf.trainepoch(trainX, trainy, epoch_size=clf.epoch_size)
+                        accuracies.append(clf.score(devX, devy))
+                    best[c] = max(best[c], np.mean(accuracies))
+                rounds[c] = budget
+            if len(alive) == 1 or budget >= maxrounds:
+                break
+            survivors = sorted(alive, key=lambda c: -best[c])[:max(1, len(alive) // eta)]
+            for c in set(alive) - set(survivors):
+                models[c] = None
+            alive = survivors
+            budget = min(maxrounds, budget * eta)
+
+    winner = max(alive, key=lambda c: best[c])
+    config, reg = candidates[winner]
+    logging.info('Successive halving : {0} candidates, {1} of {2} epochs of '
+                 'exhaustive search ({3:.0f}% saved)'.format(
+                     len(candidates), sum(rounds) * epoch_size * len(splits),
+                     len(candidates) * maxrounds * epoch_size * len(splits),
+                     100 * (1 - sum(rounds) / (len(candidates) * maxrounds))))
+    logging.info('Successive halving : best candidate {0} with reg = {1} '
+                 'and score {2}'.format({key: config[key] for key in keys}, reg,
+                                        round(100*best[winner], 2)))
+    return config, reg, round(100*best[winner], 2)
+
+
+def fit_fold(X, y, context, train_idx, test_idx, reg):
+    """
+    Score on the rows test_idx of X of a classifier trained on the rows
+    train_idx with l2reg reg; with a list of regs, one score per reg (see
+    get_classifier)
+    """
+    X_train, y_train = take(X, train_idx), y[train_idx]
+    X_test, y_test = take(X, test_idx), y[test_idx]
+    if context['usepytorch']:
+        clf = get_classifier(context['classifier'], inputdim=X.shape[1],
+                             nclasses=context['nclasses'], l2reg=reg,
+                             seed=context['seed'])
+        clf.fit(X_train, y_train, validation_data=(X_test, y_test))
+    else:
+        clf = LogisticRegression(C=reg, random_state=context['seed'])
+        clf.fit(X_train, y_train)
+    return clf.score(X_test, y_test)
+
+
+def share(X, dirname):
+    """ Saves X in dirname, returns what load_shared memory-maps it from """
+    def save(a, name):
+        fpath = os.path.join(dirname, name + '.npy')
+        np.save(fpath, np.asarray(a))
+        return fpath
+    if isinstance(X, PairFeatures):
+        return ('pairs', save(X.enc1, 'enc1'), save(X.enc2, 'enc2'), X.blocks)
+    return ('array', save(X, 'X'))
+
+
+def load_shared(spec):
+    if spec[0] == 'pairs':
+        return PairFeatures(np.load(spec[1], mmap_mode='r'),
+                            np.load(spec[2], mmap_mode='r'), spec[3])
+    return np.load(spec[1], mmap_mode='r')
+
+
+_fold_worker = None  # (X, y, context) of a FoldSearch worker process
+
+
+def init_fold_worker(spec, y, context, nthreads):
+    global _fold_worker
+    utils.limit_threads(nthreads)
+    _fold_worker = (load_shared(spec), y, context)
+
+
+def run_fold_job(job):
+    X, y, context = _fold_worker
+    return fit_fold(X, y, context, *job)
+
+
+class FoldSearch(object):
+    """
+    Mean dev score of each reg over cross-validation folds of X. The (fold,
+    reg) fits run in order, or with n_jobs in a pool of processes which
+    memory-map X once instead of receiving it with each job; each process
+    gets its share of the cpu threads. Every fit is seeded, so both give
+    the same scores.
+    """
+    def __init__(self, X, y, context, regs, sweep=False, n_jobs=None,
+                 cache=None):
+        self.X = X
+        self.y = y
+        self.context = context
+        self.regs = regs
+        self.sweep = sweep
+        self.cache = ScoreCache() if cache is None else cache
+        self.n_jobs = 1 if not n_jobs else n_jobs
+        self.pool = None
+        self.tmpdir = None
+
+    def __enter__(self):
+        if self.n_jobs > 1:
+            self.tmpdir = tempfile.mkdtemp(prefix='senteval-folds-')
+            nthreads = max(1, (os.cpu_count() or 1) // self.n_jobs)
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_fold_worker,
+                initargs=(share(self.X, self.tmpdir), self.y, self.context,
+                          nthreads))
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool is not None:
+            self.pool.shutdown()
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def scores(self, folds, name=None):
+        # folds are cached as (name, index); only missing (fold, reg) are fit
+        keys = []
+        jobs, jobregs = [], []
+        for i, (train_idx, test_idx) in enumerate(folds):
+            keys.append((name, i))
+            missing = self.cache.missing(keys[-1], self.regs)
+            if self.sweep and missing:
+                jobs.append((train_idx, test_idx, missing))
+                jobregs.append((keys[-1], missing))
+            elif not self.sweep:
+                jobs.extend((train_idx, test_idx, reg) for reg in missing)
+                jobregs.extend((keys[-1], [reg]) for reg in missing)
+        if self.cache.path is not None:
+            logging.info('Score cache: {0} of {1} fits cached'.format(
+                len(keys) * len(self.regs) - sum(len(r) for _, r in jobregs),
+                len(keys) * len(self.regs)))
+        if self.pool is None:
+            results = [fit_fold(self.X, self.y, self.context, *job) for job in jobs]
+        else:
+            results = list(self.pool.map(run_fold_job, jobs))
+        for (key, regs), result in zip(jobregs, results):
+            for reg, score in zip(regs, result if self.sweep else [result]):
+                self.cache.add(key, reg, score)
+        self.cache.save()
+        return [round(100*np.mean([self.cache.get(key, reg) for key in keys]), 2)
+                for reg in self.regs]
+
+
 # Pytorch version
 class InnerKFoldClassifier(object):
     """
@@ -51,6 +350,13 @@ class InnerKFoldClassifier(object):
         self.usepytorch = config['usepytorch']
         self.classifier_config = config['classifier']
         self.modelname = get_classif_name(self.classifier_config, self.usepytorch)
+        self.sweep = is_sweep(self.classifier_config, self.usepytorch)
+        self.halving = is_halving(self.classifier_config, self.usepytorch)
+        self.n_jobs = None if 'n_jobs' not in self.classifier_config else \
+            self.classifier_config['n_jobs']
+        self.context = {'usepytorch': self.usepytorch, 'seed': self.seed,
+                        'classifier': self.classifier_config,
+                        'nclasses': self.nclasses}
 
         self.k = 5 if 'kfold' not in config else config['kfold']
 
@@ -60,47 +366,55 @@ class InnerKFoldClassifier(object):
 
         regs = [10**t for t in range(-5, -1)] if self.usepytorch else \
                [2**t for t in range(-2, 4, 1)]
+        regs = regs if 'regs' not in self.classifier_config else \
+            list(self.classifier_config['regs'])
         skf = StratifiedKFold(n_splits=self.k, shuffle=True, random_state=1111)
         innerskf = StratifiedKFold(n_splits=self.k, shuffle=True,
                                    random_state=1111)
         count = 0
-        for train_idx, test_idx in skf.split(self.X, self.y):
-            count += 1
-            X_train, X_test = self.X[train_idx], self.X[test_idx]
-            y_train, y_test = self.y[train_idx], self.y[test_idx]
-            scores = []
-            for reg in regs:
-                regscores = []
-                for inner_train_idx, inner_test_idx in innerskf.split(X_train, y_train):
-                    X_in_train, X_in_test = X_train[inner_train_idx], X_train[inner_test_idx]
-                    y_in_train, y_in_test = y_train[inner_train_idx], y_train[inner_test_idx]
-                    if self.usepytorch:
-                        clf = MLP(self.classifier_config, inputdim=self.featdim,
-                                  nclasses=self.nclasses, l2reg=reg,
-                                  seed=self.seed)
-                        clf.fit(X_in_train, y_in_train,
-                                validation_data=(X_in_test, y_in_test))
-                    else:
-                        clf = LogisticRegression(C=reg, random_state=self.seed)
-                        clf.fit(X_in_train, y_in_train)
-                    regscores.append(clf.score(X_in_test, y_in_test))
-                scores.append(round(100*np.mean(regscores), 2))
-            optreg = regs[np.argmax(scores)]
-            logging.info('Best param found at split {0}: l2reg = {1} \
-                with score {2}'.format(count, optreg, np.max(scores)))
-            self.devresults.append(np.max(scores))
+        cache = score_cache('innerkfold-%d' % self.k, self.context,
+                            [self.X, self.y])
+        with FoldSearch(self.X, self.y, self.context, regs, self.sweep,
+                        None if self.halving else self.n_jobs, cache) as search:
+            for train_idx, test_idx in skf.split(self.X, self.y):
+                count += 1
+                X_train, X_test = take(self.X, train_idx), take(self.X, test_idx)
+                y_train, y_test = self.y[train_idx], self.y[test_idx]
+                classifier_config = self.classifier_config
+                if self.halving:
+                    with timing.stage('search', fold=count, nregs=len(regs)):
+                        classifier_config, optreg, devscore = halving_search(
+                            self.context, regs,
+                            [(take(X_train, inner_train_idx), y_train[inner_train_idx],
+                              take(X_train, inner_test_idx), y_train[inner_test_idx])
+                             for inner_train_idx, inner_test_idx
+                             in innerskf.split(X_train, y_train)])
+                else:
+                    with timing.stage('search', fold=count, nregs=len(regs)):
+                        # inner folds, as rows of self.X
+                        scores = search.scores(
+                            [(train_idx[inner_train_idx], train_idx[inner_test_idx])
+                             for inner_train_idx, inner_test_idx
+                             in innerskf.split(X_train, y_train)], name=count)
+                    optreg = regs[np.argmax(scores)]
+                    devscore = np.max(scores)
+                logging.info('Best param found at split {0}: l2reg = {1} \
+                    with score {2}'.format(count, optreg, devscore))
+                self.devresults.append(devscore)
 
-            if self.usepytorch:
-                clf = MLP(self.classifier_config, inputdim=self.featdim,
-                          nclasses=self.nclasses, l2reg=optreg,
-                          seed=self.seed)
+                with timing.stage('fit', fold=count):
+                    if self.usepytorch:
+                        clf = get_classifier(classifier_config, inputdim=self.featdim,
+                                             nclasses=self.nclasses, l2reg=optreg,
+                                             seed=self.seed)
 
-                clf.fit(X_train, y_train, validation_split=0.05)
-            else:
-                clf = LogisticRegression(C=optreg, random_state=self.seed)
-                clf.fit(X_train, y_train)
+                        clf.fit(X_train, y_train, validation_split=0.05)
+                    else:
+                        clf = LogisticRegression(C=optreg, random_state=self.seed)
+                        clf.fit(X_train, y_train)
 
-            self.testresults.append(round(100*clf.score(X_test, y_test), 2))
+                with timing.stage('score', fold=count):
+                    self.testresults.append(round(100*clf.score(X_test, y_test), 2))
 
         devaccuracy = round(np.mean(self.devresults), 2)
         testaccuracy = round(np.mean(self.testresults), 2)
@@ -120,6 +434,13 @@ class KFoldClassifier(object):
         self.usepytorch = config['usepytorch']
         self.classifier_config = config['classifier']
         self.modelname = get_classif_name(self.classifier_config, self.usepytorch)
+        self.sweep = is_sweep(self.classifier_config, self.usepytorch)
+        self.halving = is_halving(self.classifier_config, self.usepytorch)
+        self.n_jobs = None if 'n_jobs' not in self.classifier_config else \
+            self.classifier_config['n_jobs']
+        self.context = {'usepytorch': self.usepytorch, 'seed': self.seed,
+                        'classifier': self.classifier_config,
+                        'nclasses': self.nclasses}
 
         self.k = 5 if 'kfold' not in config else config['kfold']
 
@@ -129,54 +450,51 @@ class KFoldClassifier(object):
                      .format(self.modelname, self.k))
         regs = [10**t for t in range(-5, -1)] if self.usepytorch else \
                [2**t for t in range(-1, 6, 1)]
+        regs = regs if 'regs' not in self.classifier_config else \
+            list(self.classifier_config['regs'])
         skf = StratifiedKFold(n_splits=self.k, shuffle=True,
                               random_state=self.seed)
-        scores = []
-
-        for reg in regs:
-            scanscores = []
-            for train_idx, test_idx in skf.split(self.train['X'],
-                                                 self.train['y']):
-                # Split data
-                X_train, y_train = self.train['X'][train_idx], self.train['y'][train_idx]
-
-                X_test, y_test = self.train['X'][test_idx], self.train['y'][test_idx]
-
-                # Train classifier
-                if self.usepytorch:
-                    clf = MLP(self.classifier_config, inputdim=self.featdim,
-                              nclasses=self.nclasses, l2reg=reg,
-                              seed=self.seed)
-                    clf.fit(X_train, y_train, validation_data=(X_test, y_test))
-                else:
-                    clf = LogisticRegression(C=reg, random_state=self.seed)
-                    clf.fit(X_train, y_train)
-                score = clf.score(X_test, y_test)
-                scanscores.append(score)
-            # Append mean score
-            scores.append(round(100*np.mean(scanscores), 2))
-
-        # evaluation
-        logging.info([('reg:' + str(regs[idx]), scores[idx])
-                      for idx in range(len(scores))])
-        optreg = regs[np.argmax(scores)]
-        devaccuracy = np.max(scores)
-        logging.info('Cross-validation : best param found is reg = {0} \
-            with score {1}'.format(optreg, devaccuracy))
+        classifier_config = self.classifier_config
+        if self.halving:
+            with timing.stage('search', nregs=len(regs)):
+                classifier_config, optreg, devaccuracy = halving_search(
+                    self.context, regs,
+                    [(take(self.train['X'], train_idx), self.train['y'][train_idx],
+                      take(self.train['X'], test_idx), self.train['y'][test_idx])
+                     for train_idx, test_idx
+                     in skf.split(self.train['X'], self.train['y'])])
+        else:
+            cache = score_cache('kfold-%d' % self.k, self.context,
+                                [self.train['X'], self.train['y']])
+            with timing.stage('search', nregs=len(regs)):
+                with FoldSearch(self.train['X'], self.train['y'], self.context, regs,
+                                self.sweep, self.n_jobs, cache) as search:
+                    scores = search.scores(skf.split(self.train['X'], self.train['y']))
+
+            # evaluation
+            logging.info([('reg:' + str(regs[idx]), scores[idx])
+                          for idx in range(len(scores))])
+            optreg = regs[np.argmax(scores)]
+            devaccuracy = np.max(scores)
+            logging.info('Cross-validation : best param found is reg = {0} \
+                with score {1}'.format(optreg, devaccuracy))
 
         logging.info('Evaluating...')
-        if self.usepytorch:
-            clf = MLP(self.classifier_config, inputdim=self.featdim,
-                      nclasses=self.nclasses, l2reg=optreg,
-                      seed=self.seed)
-            clf.fit(self.train['X'], self.train['y'], validation_split=0.05)
-        else:
-            clf = LogisticRegression(C=optreg, random_state=self.seed)
-            clf.fit(self.train['X'], self.train['y'])
-        yhat = clf.predict(self.test['X'])
+        with timing.stage('fit'):
+            if self.usepytorch:
+                clf = get_classifier(classifier_config, inputdim=self.featdim,
+                                     nclasses=self.nclasses, l2reg=optreg,
+                                     seed=self.seed)
+                clf.fit(self.train['X'], self.train['y'], validation_split=0.05)
+            else:
+                clf = LogisticRegression(C=optreg, random_state=self.seed)
+                clf.fit(self.train['X'], self.train['y'])
+
+        with timing.stage('score'):
+            yhat = clf.predict(self.test['X'])
 
-        testaccuracy = clf.score(self.test['X'], self.test['y'])
-        testaccuracy = round(100*testaccuracy, 2)
+            testaccuracy = clf.score(self.test['X'], self.test['y'])
+            testaccuracy = round(100*testaccuracy, 2)
 
         return devaccuracy, testaccuracy, yhat
 
@@ -196,51 +514,89 @@ class SplitClassifier(object):
         self.cudaEfficient = False if 'cudaEfficient' not in config else \
             config['cudaEfficient']
         self.modelname = get_classif_name(self.classifier_config, self.usepytorch)
+        self.sweep = is_sweep(self.classifier_config, self.usepytorch)
+        self.halving = is_halving(self.classifier_config, self.usepytorch)
         self.noreg = False if 'noreg' not in config else config['noreg']
         self.config = config
+        self.context = {'usepytorch': self.usepytorch, 'seed': self.seed,
+                        'classifier': self.classifier_config,
+                        'nclasses': self.nclasses}
 
     def run(self):
         logging.info('Training {0} with standard validation..'
                      .format(self.modelname))
         regs = [10**t for t in range(-5, -1)] if self.usepytorch else \
                [2**t for t in range(-2, 4, 1)]
+        regs = regs if 'regs' not in self.classifier_config else \
+            list(self.classifier_config['regs'])
         if self.noreg:
             regs = [1e-9 if self.usepytorch else 1e9]
-        scores = []
-        for reg in regs:
+        classifier_config = self.classifier_config
+        if self.halving:
+            with timing.stage('search', nregs=len(regs)):
+                classifier_config, optreg, devaccuracy = halving_search(
+                    self.context, regs,
+                    [(self.X['train'], self.y['train'],
+                      self.X['valid'], self.y['valid'])],
+                    cudaEfficient=self.cudaEfficient)
+        else:
+            cache = score_cache('split', self.context,
+                                [self.X['train'], self.y['train'],
+                                 self.X['valid'], self.y['valid']])
+            missing = cache.missing('valid', regs)
+            if cache.path is not None:
+                logging.info('Score cache: {0} of {1} fits cached'
+                             .format(len(regs) - len(missing), len(regs)))
+            with timing.stage('search', nregs=len(missing)):
+                if self.sweep and missing:
+                    # one classifier trains all the regs
+                    clf = get_classifier(self.classifier_config, inputdim=self.featdim,
+                                         nclasses=self.nclasses, l2reg=missing,
+                                         seed=self.seed, cudaEfficient=self.cudaEfficient)
+                    clf.fit(self.X['train'], self.y['train'],
+                            validation_data=(self.X['valid'], self.y['valid']))
+                    for reg, score in zip(missing, clf.score(self.X['valid'],
+                                                             self.y['valid'])):
+                        cache.add('valid', reg, score)
+                elif not self.sweep:
+                    for reg in missing:
+                        if self.usepytorch:
+                            clf = get_classifier(self.classifier_config, inputdim=self.featdim,
+                                                 nclasses=self.nclasses, l2reg=reg,
+                                                 seed=self.seed, cudaEfficient=self.cudaEfficient)
+
+                            # TODO: Find a hack for reducing nb epoches in SNLI
+                            clf.fit(self.X['train'], self.y['train'],
+                                    validation_data=(self.X['valid'], self.y['valid']))
+                        else:
+                            clf = LogisticRegression(C=reg, random_state=self.seed)
+                            clf.fit(self.X['train'], self.y['train'])
+                        cache.add('valid', reg, clf.score(self.X['valid'],
+                                                          self.y['valid']))
+            cache.save()
+            scores = [round(100*cache.get('valid', reg), 2) for reg in regs]
+            logging.info([('reg:'+str(regs[idx]), scores[idx])
+                          for idx in range(len(scores))])
+            optreg = regs[np.argmax(scores)]
+            devaccuracy = np.max(scores)
+            logging.info('Validation : best param found is reg = {0} with score \
+                {1}'.format(optreg, devaccuracy))
+        clf = LogisticRegression(C=optreg, random_state=self.seed)
+        logging.info('Evaluating...')
+        with timing.stage('fit'):
             if self.usepytorch:
-                clf = MLP(self.classifier_config, inputdim=self.featdim,
-                          nclasses=self.nclasses, l2reg=reg,
-                          seed=self.seed, cudaEfficient=self.cudaEfficient)
+                clf = get_classifier(classifier_config, inputdim=self.featdim,
+                                     nclasses=self.nclasses, l2reg=optreg,
+                                     seed=self.seed, cudaEfficient=self.cudaEfficient)
 
                 # TODO: Find a hack for reducing nb epoches in SNLI
                 clf.fit(self.X['train'], self.y['train'],
                         validation_data=(self.X['valid'], self.y['valid']))
             else:
-                clf = LogisticRegression(C=reg, random_state=self.seed)
+                clf = LogisticRegression(C=optreg, random_state=self.seed)
                 clf.fit(self.X['train'], self.y['train'])
-            scores.append(round(100*clf.score(self.X['valid'],
-                                self.y['valid']), 2))
-        logging.info([('reg:'+str(regs[idx]), scores[idx])
-                      for idx in range(len(scores))])
-        optreg = regs[np.argmax(scores)]
-        devaccuracy = np.max(scores)
-        logging.info('Validation : best param found is reg = {0} with score \
-            {1}'.format(optreg, devaccuracy))
-        clf = LogisticRegression(C=optreg, random_state=self.seed)
-        logging.info('Evaluating...')
-        if self.usepytorch:
-            clf = MLP(self.classifier_config, inputdim=self.featdim,
-                      nclasses=self.nclasses, l2reg=optreg,
-                      seed=self.seed, cudaEfficient=self.cudaEfficient)
-
-            # TODO: Find a hack for reducing nb epoches in SNLI
-            clf.fit(self.X['train'], self.y['train'],
-                    validation_data=(self.X['valid'], self.y['valid']))
-        else:
-            clf = LogisticRegression(C=optreg, random_state=self.seed)
-            clf.fit(self.X['train'], self.y['train'])
 
-        testaccuracy = clf.score(self.X['test'], self.y['test'])
-        testaccuracy = round(100*testaccuracy, 2)
+        with timing.stage('score'):
+            testaccuracy = clf.score(self.X['test'], self.y['test'])
+            testaccuracy = round(100*testaccuracy, 2)
         return devaccuracy, testaccuracy
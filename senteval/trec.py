@@ -16,6 +16,7 @@ import io
 import logging
 import numpy as np
 
+from senteval.encoding import encode
 from senteval.tools.validation import KFoldClassifier
 
 
@@ -44,8 +45,6 @@ class TRECEval(object):
         return trec_data
 
     def run(self, params, batcher):
-        train_embeddings, test_embeddings = [], []
-
         # Sort to reduce padding
         sorted_corpus_train = sorted(zip(self.train['X'], self.train['y']),
                                      key=lambda z: (len(z[0]), z[1]))
@@ -58,19 +57,11 @@ class TRECEval(object):
         test_labels = [y for (x, y) in sorted_corpus_test]
 
         # Get train embeddings
-        for ii in range(0, len(train_labels), params.batch_size):
-            batch = train_samples[ii:ii + params.batch_size]
-            embeddings = batcher(params, batch)
-            train_embeddings.append(embeddings)
-        train_embeddings = np.vstack(train_embeddings)
+        train_embeddings = encode(params, batcher, train_samples)
         logging.info('Computed train embeddings')
 
         # Get test embeddings
-        for ii in range(0, len(test_labels), params.batch_size):
-            batch = test_samples[ii:ii + params.batch_size]
-            embeddings = batcher(params, batch)
-            test_embeddings.append(embeddings)
-        test_embeddings = np.vstack(test_embeddings)
+        test_embeddings = encode(params, batcher, test_samples)
         logging.info('Computed test embeddings')
 
         config_classifier = {'nclasses': 6, 'seed': self.seed,
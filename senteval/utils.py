@@ -7,10 +7,12 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+import os
+import logging
 import numpy as np
 import re
 import inspect
-from torch import optim
+from contextlib import contextmanager
 
 
 def create_dictionary(sentences):
@@ -46,6 +48,95 @@ class dotdict(dict):
     __delattr__ = dict.__delitem__
 
 
+def limit_threads(nthreads=None):
+    """
+    Caps the number of BLAS/OpenMP/torch threads of a worker process.
+    Defaults to one thread so that a pool of workers does not oversubscribe.
+    The environment variables only reach libraries loaded afterwards (numpy
+    is already imported in a worker), so the pools of the libraries already
+    loaded are capped at runtime with threadpoolctl, if installed.
+    """
+    nthreads = 1 if nthreads is None else nthreads
+    for var in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']:
+        os.environ[var] = str(nthreads)
+    import torch
+    torch.set_num_threads(nthreads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logging.warning('threadpoolctl is not installed: the BLAS threads of '
+                        'numpy are not capped in worker processes')
+        return
+    threadpool_limits(limits=nthreads)
+
+
+@contextmanager
+def torch_threads(nthreads=None):
+    """ torch intra-op threads set to nthreads (if set) within the block """
+    if not nthreads:
+        yield
+        return
+    import torch
+    previous = torch.get_num_threads()
+    torch.set_num_threads(nthreads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+@contextmanager
+def preserved_rng():
+    """ state of the numpy and torch generators restored after the block """
+    import torch
+    np_state, torch_state = np.random.get_state(), torch.get_rng_state()
+    cuda_state = torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+    try:
+        yield
+    finally:
+        np.random.set_state(np_state)
+        torch.set_rng_state(torch_state)
+        if cuda_state is not None:
+            torch.cuda.set_rng_state_all(cuda_state)
+
+
+def get_device(device=None):
+    """ torch device of the classifiers: cuda if available, unless set """
+    import torch
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.device(device)
+
+
+class ModelSnapshot(object):
+    """
+    Copy of the parameters and buffers of a torch model, kept in tensors
+    allocated once: save() and restore() copy in place, so the model (and
+    its optimizer) keep their tensors. Used to keep the best model during
+    early stopping.
+    """
+    def __init__(self, model):
+        self.live = list(model.state_dict().values())
+        self.saved = [tensor.detach().clone() for tensor in self.live]
+
+    def save(self, index=None):
+        # with index, only the slice index of each tensor (e.g. a member of
+        # a StackedMLP)
+        import torch
+        with torch.no_grad():
+            for saved, live in zip(self.saved, self.live):
+                if index is None:
+                    saved.copy_(live)
+                else:
+                    saved[index].copy_(live[index])
+
+    def restore(self):
+        import torch
+        with torch.no_grad():
+            for saved, live in zip(self.saved, self.live):
+                live.copy_(saved)
+
+
 def get_optimizer(s):
     """
     Parse optimizer parameters.
@@ -53,6 +144,8 @@ def get_optimizer(s):
         - "sgd,lr=0.01"
         - "adagrad,lr=0.1,lr_decay=0.05"
     """
+    from torch import optim
+
     if "," in s:
         method = s[:s.find(',')]
         optim_params = {}
@@ -86,7 +179,7 @@ def get_optimizer(s):
         raise Exception('Unknown optimization method: "%s"' % method)
 
     # check that we give good parameters to the optimizer
-    expected_args = inspect.getargspec(optim_fn.__init__)[0]
+    expected_args = inspect.getfullargspec(optim_fn.__init__)[0]
     assert expected_args[:2] == ['self', 'params']
     if not all(k in expected_args[2:] for k in optim_params.keys()):
         raise Exception('Unexpected parameters: expected "%s", got "%s"' % (